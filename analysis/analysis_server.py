@@ -0,0 +1,401 @@
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+# librosa memoizes filterbanks (mel basis, window functions) when a cache
+# directory is configured, so set it before librosa is imported
+os.environ.setdefault("LIBROSA_CACHE_DIR", os.path.join(tempfile.gettempdir(), "angel_librosa_cache"))
+
+import numpy as np
+import librosa
+
+from render import peak_rss
+from image_writer import get_image_writer
+from analyze_elements import analyze_element, analyze_midi_data, classify_element, extract_audio_features
+from pipeline import (
+    AUDIO_EXTENSIONS, SAMPLES_DIR, MIDI_DIR, IMAGE_DIR, VISUALIZATION_DIR, element_name, midi_path_for,
+    load_visualization_helpers, scan_samples
+)
+import spectrogram_tiles
+
+class AudioCache:
+    """
+    LRU cache of decoded audio keyed by path and file fingerprint, bounded by total bytes.
+    """
+
+    def __init__(self, max_bytes=512 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def load(self, path):
+        stat = os.stat(path)
+        key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+
+        with self._lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+            self.misses += 1
+
+        y, sr = librosa.load(path, sr=None)
+
+        with self._lock:
+            if key not in self.entries:
+                self.entries[key] = (y, sr)
+                self.total_bytes += y.nbytes
+                # Evict least recently used entries, always keeping the newest one
+                while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+                    _, (old_y, _) = self.entries.popitem(last=False)
+                    self.total_bytes -= old_y.nbytes
+            return self.entries[key]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self.entries),
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses
+            }
+
+class AnalysisService:
+    """
+    Keeps the analysis stack warm and runs requests on a bounded worker pool.
+    Concurrent requests for the same work on the same file share one result.
+    """
+
+    def __init__(self, workers=2, cache_bytes=512 * 1024 * 1024, transcription=True):
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.audio_cache = AudioCache(cache_bytes)
+        self.helpers = load_visualization_helpers()
+        self.model = None
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+        # matplotlib is not thread-safe, so renders must not overlap
+        self._render_lock = threading.Lock()
+        self._model_lock = threading.Lock()
+
+        if transcription:
+            from basic_pitch import ICASSP_2022_MODEL_PATH
+            from basic_pitch.inference import Model
+            self.model = Model(ICASSP_2022_MODEL_PATH)
+
+        self.warm_up()
+
+    def warm_up(self):
+        """
+        Run the feature extraction once on a short synthetic signal so
+        numba-compiled librosa internals and filterbanks are ready.
+        """
+        start_time = time.time()
+        sr = 22050
+        y = np.random.default_rng(0).standard_normal(2 * sr).astype(np.float32) * 0.1
+        extract_audio_features(y, sr)
+        librosa.piptrack(y=y, sr=sr, fmin=30, fmax=300)
+        librosa.feature.melspectrogram(y=y, sr=sr, n_mels=128)
+        print(f"Warm-up finished in {time.time() - start_time:.1f}s")
+
+    def submit(self, action, path, options):
+        """
+        Run action on the worker pool, coalescing with an identical request in flight.
+        """
+        stat = os.stat(path)
+        key = (action, os.path.abspath(path), stat.st_mtime_ns, stat.st_size,
+               json.dumps(options, sort_keys=True))
+
+        with self._inflight_lock:
+            future = self._inflight.get(key)
+            created = future is None
+            if created:
+                handler = getattr(self, f"do_{action}")
+                future = self.executor.submit(handler, path, options)
+                self._inflight[key] = future
+
+        # Outside the lock: a future that is already done runs the callback
+        # immediately on this thread, and _forget takes the same lock
+        if created:
+            future.add_done_callback(lambda _: self._forget(key))
+
+        return future.result()
+
+    def _forget(self, key):
+        with self._inflight_lock:
+            self._inflight.pop(key, None)
+
+    def _audio_for(self, path):
+        if Path(path).suffix.lower() in AUDIO_EXTENSIONS:
+            return self.audio_cache.load(path)
+        return None
+
+    def do_analyze(self, path, options):
+        audio = self._audio_for(path)
+        if options.get("images"):
+            with self._render_lock:
+                analysis = analyze_element(path, str(IMAGE_DIR), audio)
+            # Wait for the encoding outside the lock, so the next render can start
+            get_image_writer().flush()
+        else:
+            analysis = analyze_element(path, None, audio)
+        analysis["element_type"] = classify_element(element_name(path), analysis)
+        return analysis
+
+    def do_visualize(self, path, options):
+        kind = options.get("kind", "auto")
+        audio = self._audio_for(path)
+        output_dir = str(VISUALIZATION_DIR)
+
+        with self._render_lock:
+            if audio is None:
+                result = self.helpers.visualize_midi_file(path, output_dir)
+            elif kind == "break":
+                result = self.helpers.generate_break_visualization(path, output_dir, audio)
+            elif kind == "bass":
+                result = self.helpers.generate_bass_visualization(path, output_dir, audio)
+            else:
+                result = self.helpers.visualize_audio_file(path, output_dir, audio)
+        get_image_writer().flush()
+        return result
+
+    def do_transcribe(self, path, options):
+        if self.model is None:
+            return {"error": "Transcription is disabled on this server"}
+
+        from basic_pitch.inference import predict
+
+        with self._model_lock:
+            _, midi_data, _ = predict(path, self.model)
+
+        midi_path = midi_path_for(path, MIDI_DIR)
+        os.makedirs(midi_path.parent, exist_ok=True)
+        midi_data.write(str(midi_path))
+
+        analysis = analyze_midi_data(midi_data)
+        analysis["midi_path"] = str(midi_path)
+        return analysis
+
+    def do_tiles(self, path, options):
+        """Build (or return the existing) tile pyramid manifest for a file."""
+        name, kind = Path(path).stem, options["kind"]
+        manifest_path = spectrogram_tiles.tile_dir(name, kind) / "manifest.json"
+        # The set cannot be swapped between reading the manifest and its mtime
+        with spectrogram_tiles.tile_set_lock(name, kind):
+            manifest = spectrogram_tiles.load_manifest(name, kind)
+            stale = manifest is None or manifest_path.stat().st_mtime < os.stat(path).st_mtime
+        if stale:
+            manifest = spectrogram_tiles.build_pyramid(path, kind, audio=self._audio_for(path))
+        return manifest
+
+    def do_tile(self, path, options):
+        """Render a single tile on first request and return its PNG (the pyramid must already exist)."""
+        return spectrogram_tiles.read_tile(Path(path).stem, options["kind"],
+                                           options["zoom"], options["x"], options["y"])
+
+    def stats(self):
+        with self._inflight_lock:
+            inflight = len(self._inflight)
+        return {
+            "audio_cache": self.audio_cache.stats(),
+            "inflight": inflight,
+            "peak_rss": peak_rss(),
+            "image_writer": get_image_writer().stats(),
+            "transcription": self.model is not None
+        }
+
+class AnalysisRequestHandler(BaseHTTPRequestHandler):
+    """
+    POST /analyze, /visualize or /transcribe with a JSON body {"path": ..., ...options}.
+    GET /health returns cache statistics.
+    GET /tiles/{name}/{kind}/manifest.json and /tiles/{name}/{kind}/{zoom}/{x}/{y}.png
+    serve spectrogram tiles, generating them on first request.
+
+    Any web page the developer visits can reach a local port, so only the
+    frontend dev server's origin gets CORS access, POSTs must be
+    application/json (which forces a preflight from browsers), paths must lie
+    under the allowed roots and outputs always go to the fixed data directories.
+    """
+
+    service = None
+    actions = ["analyze", "visualize", "transcribe"]
+    allowed_origin = "http://localhost:3000"
+    allowed_roots = [SAMPLES_DIR]
+
+    def origin_allowed(self):
+        origin = self.headers.get("Origin")
+        return origin is None or origin == self.allowed_origin
+
+    def send_cors_headers(self):
+        if self.headers.get("Origin") == self.allowed_origin:
+            self.send_header("Access-Control-Allow-Origin", self.allowed_origin)
+            self.send_header("Vary", "Origin")
+
+    def path_allowed(self, path):
+        real_path = os.path.realpath(path)
+        for root in self.allowed_roots:
+            real_root = os.path.realpath(root)
+            if os.path.commonpath([real_path, real_root]) == real_root:
+                return True
+        return False
+
+    def do_OPTIONS(self):
+        if self.headers.get("Origin") != self.allowed_origin:
+            self.send_json(403, {"error": "Origin not allowed"})
+            return
+        self.send_response(204)
+        self.send_cors_headers()
+        self.send_header("Access-Control-Allow-Methods", "GET, POST")
+        self.send_header("Access-Control-Allow-Headers", "Content-Type")
+        self.send_header("Access-Control-Max-Age", "600")
+        self.end_headers()
+
+    def do_GET(self):
+        if self.path == "/health":
+            self.send_json(200, {"status": "ok", **self.service.stats()})
+        elif self.path.startswith("/tiles/"):
+            # Tile requests build pyramids and write files, like the POST actions
+            if not self.origin_allowed():
+                self.send_json(403, {"error": "Origin not allowed"})
+                return
+            self.send_tile(self.path.split("/")[2:])
+        else:
+            self.send_json(404, {"error": f"Unknown endpoint: {self.path}"})
+
+    def send_tile(self, parts):
+        samples = {Path(p).stem: p for p in scan_samples() if Path(p).suffix.lower() in AUDIO_EXTENSIONS}
+        if len(parts) < 3 or parts[0] not in samples or parts[1] not in spectrogram_tiles.KINDS:
+            self.send_json(404, {"error": f"Unknown tile set: {self.path}"})
+            return
+
+        path, kind = samples[parts[0]], parts[1]
+        try:
+            # Make sure the pyramid is built and current before touching tiles
+            manifest = self.service.submit("tiles", path, {"kind": kind})
+            if parts[2:] == ["manifest.json"]:
+                self.send_json(200, manifest)
+                return
+
+            zoom, x, y = int(parts[2]), int(parts[3]), int(parts[4].removesuffix(".png"))
+            body = self.service.submit("tile", path, {"kind": kind, "zoom": zoom, "x": x, "y": y})
+        except (ValueError, IndexError):
+            self.send_json(400, {"error": f"Malformed tile path: {self.path}"})
+            return
+        except Exception as e:
+            self.send_json(500, {"error": str(e)})
+            return
+
+        if body is None:
+            self.send_json(404, {"error": f"Tile out of range: {self.path}"})
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "image/png")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "public, max-age=3600")
+        self.send_cors_headers()
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        action = self.path.strip("/")
+        if action not in self.actions:
+            self.send_json(404, {"error": f"Unknown endpoint: {self.path}"})
+            return
+
+        if not self.origin_allowed():
+            self.send_json(403, {"error": "Origin not allowed"})
+            return
+
+        content_type = self.headers.get("Content-Type", "").split(";")[0].strip().lower()
+        if content_type != "application/json":
+            self.send_json(415, {"error": "Expected Content-Type: application/json"})
+            return
+
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            options = json.loads(self.rfile.read(length) or b"{}")
+            if not isinstance(options, dict) or not isinstance(options.get("path"), str):
+                raise ValueError
+            path = options.pop("path")
+        except ValueError:
+            self.send_json(400, {"error": "Expected a JSON body with a path"})
+            return
+
+        if not self.path_allowed(path):
+            self.send_json(403, {"error": f"Path outside the allowed directories: {path}"})
+            return
+
+        if not os.path.isfile(path):
+            self.send_json(404, {"error": f"File not found: {path}"})
+            return
+
+        start_time = time.time()
+        try:
+            result = self.service.submit(action, path, options)
+        except Exception as e:
+            self.send_json(500, {"error": str(e)})
+            return
+
+        # Coalesced requests share the result, so annotate a copy
+        self.send_json(200, {**result, "elapsed": time.time() - start_time})
+
+    def send_json(self, status, data):
+        body = json.dumps(data, cls=self.service.helpers.NumpyEncoder).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_cors_headers()
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        print(f"{self.address_string()} - {format % args}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Local analysis service with warm caches")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8710)
+    parser.add_argument("--workers", type=int, default=2,
+                        help="Maximum number of requests processed at once")
+    parser.add_argument("--cache-mb", type=int, default=512,
+                        help="Memory budget for decoded audio in MB")
+    parser.add_argument("--no-transcription", action="store_true",
+                        help="Do not load the basic-pitch model")
+    parser.add_argument("--allow-origin", default=AnalysisRequestHandler.allowed_origin,
+                        help="The only browser origin allowed to call the service")
+    parser.add_argument("--allow-root", action="append",
+                        help="Directory whose files may be analyzed (default: samples/)")
+    args = parser.parse_args()
+
+    AnalysisRequestHandler.allowed_origin = args.allow_origin
+    if args.allow_root:
+        AnalysisRequestHandler.allowed_roots = [Path(root) for root in args.allow_root]
+
+    AnalysisRequestHandler.service = AnalysisService(
+        workers=args.workers,
+        cache_bytes=args.cache_mb * 1024 * 1024,
+        transcription=not args.no_transcription
+    )
+
+    server = ThreadingHTTPServer((args.host, args.port), AnalysisRequestHandler)
+    print(f"Analysis service listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -1,119 +1,168 @@
-import pretty_midi
 import numpy as np
 import json
 import os
 import glob
-import librosa
-import librosa.display
-import matplotlib.pyplot as plt
 from pathlib import Path
 import base64
-from io import BytesIO
 
-def analyze_audio_file(audio_file, output_dir=None):
+from harmony import analyze_harmony
+
+# librosa, matplotlib and pretty_midi are imported inside the functions that
+# need them, so MIDI-only and feature-only runs never load the plotting stack
+
+def quantize_rhythm_pattern(onset_env, steps=16):
+    """
+    Resample an onset strength envelope to a fixed number of steps, normalized to 0-1.
+    """
+    if len(onset_env) == 0:
+        return []
+    
+    resampled_onsets = np.interp(
+        np.linspace(0, len(onset_env)-1, steps),
+        np.arange(len(onset_env)),
+        onset_env
+    )
+    # Normalize to 0-1 range
+    max_val = np.max(resampled_onsets)
+    if max_val > 0:
+        return (resampled_onsets / max_val).tolist()
+    return resampled_onsets.tolist()
+
+def pitch_contour_from_piptrack(pitches, magnitudes):
+    """
+    Pick the most prominent pitch in each frame of a piptrack result (NaN when unvoiced).
+    """
+    pitch_contour = []
+    for t, mag in zip(range(magnitudes.shape[1]), magnitudes.T):
+        index = mag.argmax()
+        pitch = pitches[index, t]
+        pitch_contour.append(float(pitch) if pitch > 0 else np.nan)
+    return pitch_contour
+
+def extract_audio_features(y, sr, n_mels=128, fast_tempo=False):
+    """
+    Extract tempo, onset, rhythm and spectral features from a decoded signal.
+    Shared by whole-file analysis and by segment analysis of a longer mix.
+    
+    n_mels and fast_tempo select cheaper approximations: fewer mel bands for
+    the onset envelope, and a tempo estimate from the existing onset envelope
+    instead of full beat tracking.
+    """
+    import librosa
+    
+    # Extract onset strength (useful for detecting transients in breaks)
+    onset_env = librosa.onset.onset_strength(y=y, sr=sr, n_mels=n_mels)
+    onset_frames = librosa.onset.onset_detect(onset_envelope=onset_env, sr=sr)
+    onset_times = librosa.frames_to_time(onset_frames, sr=sr)
+    
+    # Detect tempo
+    if fast_tempo:
+        tempo = librosa.feature.tempo(onset_envelope=onset_env, sr=sr)[0]
+    else:
+        tempo, _ = librosa.beat.beat_track(y=y, sr=sr)
+        # librosa >= 0.10 returns the tempo as a 1-element array
+        tempo = np.atleast_1d(tempo)[0]
+    
+    # Extract rhythmic pattern based on onset strength
+    rhythm_pattern = quantize_rhythm_pattern(onset_env)
+    
+    # Calculate spectral features
+    spectral_centroid = librosa.feature.spectral_centroid(y=y, sr=sr)[0]
+    spectral_bandwidth = librosa.feature.spectral_bandwidth(y=y, sr=sr)[0]
+    
+    # Calculate RMS energy
+    rms = librosa.feature.rms(y=y)[0]
+    
+    return {
+        "duration": float(len(y) / sr),
+        "sample_rate": sr,
+        "tempo": float(tempo),
+        "onset_count": len(onset_frames),
+        "onset_density": float(len(onset_frames) / (len(y) / sr)) if len(y) > 0 else 0,
+        "onset_times": [float(t) for t in onset_times],
+        "rhythm_pattern": rhythm_pattern,
+        "spectral_centroid_mean": float(np.mean(spectral_centroid)),
+        "spectral_bandwidth_mean": float(np.mean(spectral_bandwidth)),
+        "rms_mean": float(np.mean(rms)),
+        "rms_max": float(np.max(rms)) if len(rms) > 0 else 0
+    }
+
+def analyze_audio_file(audio_file, output_dir=None, audio=None, sr=None, n_mels=128, fast_tempo=False):
     """
     Analyze audio file using librosa to extract waveform and spectrogram,
     saving images for visualization and returning key metrics.
+    
+    An already decoded (y, sr) pair can be passed as audio to skip loading the file.
+    sr resamples on load (None keeps the native rate); n_mels and fast_tempo
+    are passed on to extract_audio_features.
     """
     try:
+        import librosa
+        
         # Load the audio file
-        y, sr = librosa.load(audio_file, sr=None)
+        y, sr = audio if audio is not None else librosa.load(audio_file, sr=sr)
         
         # Create output directory for images if specified
         if output_dir:
             os.makedirs(output_dir, exist_ok=True)
+            import librosa.display
+            from render import get_renderer
+            from image_writer import get_image_writer
+            renderer = get_renderer()
+            writer = get_image_writer()
             
         # Extract file name without extension
         file_name = os.path.basename(audio_file).split('.')[0]
         
         # Generate waveform image
-        waveform_data = None
+        waveform_png = None
+        waveform_image = None
         if output_dir:
-            plt.figure(figsize=(10, 3))
-            plt.plot(np.linspace(0, len(y)/sr, len(y)), y)
-            plt.title(f"Waveform: {file_name}")
-            plt.xlabel("Time (s)")
-            plt.ylabel("Amplitude")
-            plt.tight_layout()
-            
-            # Save to buffer for base64 encoding
-            buffer = BytesIO()
-            plt.savefig(buffer, format='png')
-            buffer.seek(0)
-            waveform_data = base64.b64encode(buffer.read()).decode('utf-8')
-            
-            # Also save to file
-            plt.savefig(f"{output_dir}/{file_name}_waveform.png")
-            plt.close()
+            with renderer.figure("waveform", (10, 3)) as (fig, (ax,)):
+                ax.plot(np.linspace(0, len(y)/sr, len(y)), y)
+                ax.set_title(f"Waveform: {file_name}")
+                ax.set_xlabel("Time (s)")
+                ax.set_ylabel("Amplitude")
+                fig.tight_layout()
+                
+                # Draw once and encode in the background while the analysis goes on;
+                # the file reuses the base64 PNG unless another format is configured
+                frame = writer.capture(fig)
+                waveform_png = writer.encode_async(frame, format="png")
+                waveform_image = writer.write(frame, output_dir, f"{file_name}_waveform",
+                                              encoded=waveform_png if writer.format == "png" else None)
         
         # Generate spectrogram image
-        spectrogram_data = None
+        spectrogram_png = None
+        spectrogram_image = None
         if output_dir:
-            plt.figure(figsize=(10, 6))
-            D = librosa.amplitude_to_db(np.abs(librosa.stft(y)), ref=np.max)
-            librosa.display.specshow(D, sr=sr, x_axis='time', y_axis='log')
-            plt.colorbar(format='%+2.0f dB')
-            plt.title(f"Spectrogram: {file_name}")
-            plt.tight_layout()
-            
-            # Save to buffer for base64 encoding
-            buffer = BytesIO()
-            plt.savefig(buffer, format='png')
-            buffer.seek(0)
-            spectrogram_data = base64.b64encode(buffer.read()).decode('utf-8')
-            
-            # Also save to file
-            plt.savefig(f"{output_dir}/{file_name}_spectrogram.png")
-            plt.close()
-        
-        # Extract onset strength (useful for detecting transients in breaks)
-        onset_env = librosa.onset.onset_strength(y=y, sr=sr)
-        onset_frames = librosa.onset.onset_detect(onset_envelope=onset_env, sr=sr)
-        onset_times = librosa.frames_to_time(onset_frames, sr=sr)
-        
-        # Detect tempo
-        tempo, _ = librosa.beat.beat_track(y=y, sr=sr)
-        
-        # Extract rhythmic pattern based on onset strength
-        rhythm_pattern = []
-        if len(onset_env) > 0:
-            # Normalize and quantize to 16 steps
-            quantized_length = 16
-            resampled_onsets = np.interp(
-                np.linspace(0, len(onset_env)-1, quantized_length),
-                np.arange(len(onset_env)),
-                onset_env
-            )
-            # Normalize to 0-1 range
-            max_val = np.max(resampled_onsets)
-            if max_val > 0:
-                normalized = resampled_onsets / max_val
-                rhythm_pattern = normalized.tolist()
-            else:
-                rhythm_pattern = resampled_onsets.tolist()
+            with renderer.figure("spectrogram", (10, 6)) as (fig, (ax,)):
+                D = librosa.amplitude_to_db(np.abs(librosa.stft(y)), ref=np.max)
+                img = librosa.display.specshow(D, sr=sr, x_axis='time', y_axis='log', ax=ax)
+                fig.colorbar(img, ax=ax, format='%+2.0f dB')
+                ax.set_title(f"Spectrogram: {file_name}")
+                fig.tight_layout()
+                
+                frame = writer.capture(fig)
+                spectrogram_png = writer.encode_async(frame, format="png")
+                spectrogram_image = writer.write(frame, output_dir, f"{file_name}_spectrogram",
+                                                 encoded=spectrogram_png if writer.format == "png" else None)
         
-        # Calculate spectral features
-        spectral_centroid = librosa.feature.spectral_centroid(y=y, sr=sr)[0]
-        spectral_bandwidth = librosa.feature.spectral_bandwidth(y=y, sr=sr)[0]
+        # Extract rhythm and spectral features
+        features = extract_audio_features(y, sr, n_mels=n_mels, fast_tempo=fast_tempo)
         
-        # Calculate RMS energy
-        rms = librosa.feature.rms(y=y)[0]
+        # The PNGs were encoded while the features were extracted
+        waveform_data = base64.b64encode(waveform_png.result()).decode('utf-8') if waveform_png else None
+        spectrogram_data = base64.b64encode(spectrogram_png.result()).decode('utf-8') if spectrogram_png else None
         
         # Return analysis results
         return {
             "type": "audio",
-            "duration": float(len(y) / sr),
-            "sample_rate": sr,
-            "tempo": float(tempo),
-            "onset_count": len(onset_frames),
-            "onset_density": float(len(onset_frames) / (len(y) / sr)) if len(y) > 0 else 0,
-            "rhythm_pattern": rhythm_pattern,
-            "spectral_centroid_mean": float(np.mean(spectral_centroid)),
-            "spectral_bandwidth_mean": float(np.mean(spectral_bandwidth)),
-            "rms_mean": float(np.mean(rms)),
-            "rms_max": float(np.max(rms)) if len(rms) > 0 else 0,
+            **features,
             "has_waveform_image": waveform_data is not None,
             "has_spectrogram_image": spectrogram_data is not None,
+            "waveform_image": waveform_image,
+            "spectrogram_image": spectrogram_image,
             "waveform_base64": waveform_data,
             "spectrogram_base64": spectrogram_data
         }
@@ -125,8 +174,19 @@ def analyze_midi_file(midi_file):
     Analyze MIDI file to extract musical patterns and features for visualization.
     """
     try:
+        import pretty_midi
         midi_data = pretty_midi.PrettyMIDI(midi_file)
-        
+    except Exception as e:
+        return {"error": str(e), "type": "midi"}
+    
+    return analyze_midi_data(midi_data)
+
+def analyze_midi_data(midi_data):
+    """
+    Extract musical patterns and features from an already loaded PrettyMIDI object,
+    e.g. a transcription produced in memory by basic-pitch.
+    """
+    try:
         # Extract notes from all instruments
         all_notes = [note for instrument in midi_data.instruments for note in instrument.notes]
         
@@ -206,6 +266,13 @@ def analyze_midi_file(midi_file):
             "note_sequence": note_sequence[:100]  # Limit to first 100 notes for visualization
         }
         
+        # Key and the full beat-level chord timeline (see harmony.py)
+        harmony = analyze_harmony(midi_data)
+        if "error" not in harmony:
+            fingerprint["key"] = harmony["key"]
+            fingerprint["key_confidence"] = harmony["key_confidence"]
+            fingerprint["chord_timeline"] = harmony["chord_timeline"]
+        
         return fingerprint
     except Exception as e:
         return {"error": str(e), "type": "midi"}
@@ -230,9 +297,10 @@ def calculate_pitch_histogram(notes, bins=12):
     
     return histogram
 
-def analyze_element(file_path, output_dir=None):
+def analyze_element(file_path, output_dir=None, audio=None):
     """
     Analyze an element file (either audio or MIDI) and return appropriate analysis.
+    For audio files, a decoded (y, sr) pair can be passed as audio.
     """
     file_path = str(file_path)  # Convert Path to string if needed
     file_name = os.path.basename(file_path)
@@ -244,7 +312,7 @@ def analyze_element(file_path, output_dir=None):
         analysis = analyze_midi_file(file_path)
     elif extension in ['.wav', '.mp3', '.ogg', '.flac']:
         print(f"Analyzing audio: {file_name}")
-        analysis = analyze_audio_file(file_path, output_dir)
+        analysis = analyze_audio_file(file_path, output_dir, audio)
     else:
         return {"error": f"Unsupported file type: {extension}", "type": "unknown"}
     
@@ -296,6 +364,36 @@ def classify_element(file_name, analysis):
     
     return "unknown"
 
+def build_visualization_element(name, analysis):
+    """
+    Build the simplified visualization entry for one analyzed element.
+    """
+    viz_element = {
+        "name": name,
+        "type": analysis["element_type"],
+        "file_type": analysis["type"],
+        "duration": analysis.get("duration", 0)
+    }
+    
+    # Add visualization-specific data based on type
+    if analysis["type"] == "midi":
+        viz_element.update({
+            "pitch_histogram": analysis.get("pitch_histogram", []),
+            "most_common_pitches": analysis.get("most_common_pitches", []),
+            "note_density_over_time": analysis.get("note_density_over_time", [])
+        })
+    else:  # audio
+        # Image names carry the extension of the configured image format
+        waveform_image = analysis.get("waveform_image") or f"{name}_waveform.png"
+        spectrogram_image = analysis.get("spectrogram_image") or f"{name}_spectrogram.png"
+        viz_element.update({
+            "rhythm_pattern": analysis.get("rhythm_pattern", []),
+            "waveform_url": f"images/{waveform_image}" if analysis.get("has_waveform_image") else None,
+            "spectrogram_url": f"images/{spectrogram_image}" if analysis.get("has_spectrogram_image") else None
+        })
+    
+    return viz_element
+
 def main():
     # Create directories
     data_dir = Path("../data")
@@ -338,6 +436,10 @@ def main():
         # Store analysis
         element_analysis[file_name] = analysis
     
+    # Wait for the images still being encoded
+    from image_writer import get_image_writer
+    get_image_writer().close()
+    
     # Save analysis to JSON
     output_path = data_dir / "element_analysis.json"
     with open(output_path, "w") as f:
@@ -346,28 +448,7 @@ def main():
     # Create a simplified version for visualization
     visualization_data = {}
     for name, analysis in element_analysis.items():
-        viz_element = {
-            "name": name,
-            "type": analysis["element_type"],
-            "file_type": analysis["type"],
-            "duration": analysis.get("duration", 0)
-        }
-        
-        # Add visualization-specific data based on type
-        if analysis["type"] == "midi":
-            viz_element.update({
-                "pitch_histogram": analysis.get("pitch_histogram", []),
-                "most_common_pitches": analysis.get("most_common_pitches", []),
-                "note_density_over_time": analysis.get("note_density_over_time", [])
-            })
-        else:  # audio
-            viz_element.update({
-                "rhythm_pattern": analysis.get("rhythm_pattern", []),
-                "waveform_url": f"images/{name}_waveform.png" if analysis.get("has_waveform_image") else None,
-                "spectrogram_url": f"images/{name}_spectrogram.png" if analysis.get("has_spectrogram_image") else None
-            })
-        
-        visualization_data[name] = viz_element
+        visualization_data[name] = build_visualization_element(name, analysis)
     
     # Save visualization data to JSON
     viz_output_path = data_dir / "visualization_data.json"
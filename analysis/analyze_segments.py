@@ -0,0 +1,213 @@
+import argparse
+import json
+import os
+import re
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+from pathlib import Path
+
+import numpy as np
+import librosa
+
+from analyze_elements import extract_audio_features, analyze_midi_data
+
+# Decoded mix shared with worker processes (set once per worker by _init_worker)
+_mix_memory = None
+_mix_audio = None
+_mix_sr = None
+_transcription_model = None
+
+def pattern_key(pattern_name):
+    """
+    Build the lookup key used by lib/dataLoader.ts for a pattern name
+    (lowercased, whitespace replaced by underscores).
+    """
+    return re.sub(r"\s+", "_", pattern_name.lower())
+
+def load_segments(annotations_path):
+    """
+    Read the mix annotation timeline and return one job per annotated range.
+    """
+    with open(annotations_path) as f:
+        annotations = json.load(f)
+
+    segments = []
+    for pattern in annotations.get("patterns", []):
+        for index, timestamp in enumerate(pattern.get("timestamps", [])):
+            segments.append({
+                "pattern": pattern["name"],
+                "key": pattern_key(pattern["name"]),
+                "timestamp_index": index,
+                "start": float(timestamp["start"]),
+                "end": float(timestamp["end"]),
+                "song": timestamp.get("song")
+            })
+
+    return segments
+
+def _init_worker(memory_name, shape, dtype, sr, transcribe):
+    """
+    Attach the worker to the decoded mix in shared memory, so segments are
+    sliced from the single decode instead of each worker holding a copy.
+    """
+    global _mix_memory, _mix_audio, _mix_sr, _transcription_model
+    # Keep the SharedMemory object alive for as long as the array uses its buffer
+    _mix_memory = shared_memory.SharedMemory(name=memory_name)
+    _mix_audio = np.ndarray(shape, dtype=dtype, buffer=_mix_memory.buf)
+    _mix_sr = sr
+
+    if transcribe:
+        from basic_pitch import ICASSP_2022_MODEL_PATH
+        from basic_pitch.inference import Model
+        _transcription_model = Model(ICASSP_2022_MODEL_PATH)
+
+def transcribe_segment(y, sr):
+    """
+    Transcribe a decoded segment with basic-pitch and return its MIDI analysis.
+    """
+    import soundfile as sf
+    from basic_pitch.inference import predict
+
+    # basic-pitch reads from disk, so hand it the slice as a temporary WAV
+    with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as tmp:
+        tmp_path = tmp.name
+    try:
+        sf.write(tmp_path, y, sr)
+        _, midi_data, _ = predict(tmp_path, _transcription_model)
+    finally:
+        os.remove(tmp_path)
+
+    return analyze_midi_data(midi_data)
+
+def analyze_segment(segment):
+    """
+    Analyze one annotated range of the mix (tempo, onset grid, spectral features
+    and, if the worker was started with a model, a transcription).
+    """
+    result = dict(segment)
+    try:
+        start_sample = int(segment["start"] * _mix_sr)
+        end_sample = min(int(segment["end"] * _mix_sr), len(_mix_audio))
+
+        if end_sample <= start_sample:
+            result["error"] = "Segment lies outside the mix"
+            return result
+
+        # Slicing is a view into the shared memory block, no copy is made
+        y = _mix_audio[start_sample:end_sample]
+        result.update(extract_audio_features(y, _mix_sr))
+
+        if _transcription_model is not None:
+            result["midi"] = transcribe_segment(y, _mix_sr)
+    except Exception as e:
+        result["error"] = str(e)
+
+    return result
+
+def summarize_segments(segments):
+    """
+    Aggregate per-segment features into a summary for the whole pattern.
+    """
+    valid = [s for s in segments if "error" not in s]
+    if not valid:
+        return {}
+
+    summary = {
+        "segment_count": len(valid),
+        "total_duration": float(sum(s["duration"] for s in valid)),
+        "tempo_mean": float(np.mean([s["tempo"] for s in valid])),
+        "onset_density_mean": float(np.mean([s["onset_density"] for s in valid])),
+        "spectral_centroid_mean": float(np.mean([s["spectral_centroid_mean"] for s in valid])),
+        "rms_mean": float(np.mean([s["rms_mean"] for s in valid]))
+    }
+
+    patterns = [s["rhythm_pattern"] for s in valid if len(s["rhythm_pattern"]) == 16]
+    if patterns:
+        summary["rhythm_pattern"] = np.mean(patterns, axis=0).tolist()
+
+    return summary
+
+def analyze_mix_segments(mix_file, annotations_path, sr=None, workers=None, transcribe=False):
+    """
+    Decode the mix once and analyze every annotated pattern range in parallel.
+
+    Returns a dict keyed like element_analysis.json so that
+    loadEnhancedMixData can attach the results to each pattern directly.
+    """
+    segments = load_segments(annotations_path)
+    if not segments:
+        print(f"No annotated segments found in {annotations_path}")
+        return {}
+
+    print(f"Decoding mix: {mix_file}")
+    y, sr = librosa.load(mix_file, sr=sr)
+
+    # Move the decode into one shared memory block that every worker maps:
+    # pickling it into each worker would cost one full copy per process
+    memory = shared_memory.SharedMemory(create=True, size=max(y.nbytes, 1))
+    shape, dtype = y.shape, y.dtype
+    np.ndarray(shape, dtype=dtype, buffer=memory.buf)[:] = y
+    del y
+
+    print(f"Analyzing {len(segments)} segments...")
+    results = []
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(memory.name, shape, dtype, sr, transcribe)) as executor:
+            futures = [executor.submit(analyze_segment, segment) for segment in segments]
+            for future in as_completed(futures):
+                result = future.result()
+                if "error" in result:
+                    print(f"Error analyzing {result['pattern']} at {result['start']}s: {result['error']}")
+                results.append(result)
+    finally:
+        memory.close()
+        memory.unlink()
+
+    # Group results by pattern key, in timeline order
+    segment_analysis = {}
+    for result in sorted(results, key=lambda r: (r["key"], r["timestamp_index"])):
+        entry = segment_analysis.setdefault(result["key"], {
+            "name": result["pattern"],
+            "segments": []
+        })
+        entry["segments"].append(result)
+
+    for entry in segment_analysis.values():
+        entry["summary"] = summarize_segments(entry["segments"])
+
+    return segment_analysis
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyze annotated pattern ranges of a mix")
+    parser.add_argument("mix_file", help="Path to the full mix audio file")
+    parser.add_argument("--annotations", default="../public/data/mix_annotations.json",
+                        help="Mix annotation timeline")
+    parser.add_argument("--output", default="../data/segment_analysis.json",
+                        help="Where to write the segment analysis JSON")
+    parser.add_argument("--sr", type=int, default=None,
+                        help="Resample the mix to this rate (default: native rate)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Number of worker processes (default: CPU count)")
+    parser.add_argument("--transcribe", action="store_true",
+                        help="Also transcribe each segment with basic-pitch")
+    args = parser.parse_args()
+
+    segment_analysis = analyze_mix_segments(
+        args.mix_file,
+        args.annotations,
+        sr=args.sr,
+        workers=args.workers,
+        transcribe=args.transcribe
+    )
+
+    output_path = Path(args.output)
+    os.makedirs(output_path.parent, exist_ok=True)
+    with open(output_path, "w") as f:
+        json.dump(segment_analysis, f, indent=4)
+
+    print(f"Segment analysis complete! Results saved to {output_path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+Command line entry point for the analysis pipeline.
+
+    python cli.py [--stats] analyze [files...] [--features-only] [--output FILE]
+                                    [--jobs N] [--memory-budget MB]
+    python cli.py visualize [files...]
+    python cli.py transcribe [files...]
+    python cli.py run [files...]
+
+Without files, every sample in samples/ and samples/midi/ is processed.
+Images are encoded in the background (see image_writer.py); --image-format,
+--compress-level, --palette-colors and --encode-workers tune the encoder.
+Heavy dependencies are only imported by the commands that use them:
+MIDI analysis loads pretty_midi, audio features load librosa, and only image
+output loads matplotlib. With --features-only nothing is rendered at all.
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+from image_writer import DEFAULT_SETTINGS, FORMATS, configure_image_writer, get_image_writer
+from pipeline import (
+    AUDIO_EXTENSIONS, DATA_DIR, IMAGE_DIR, VISUALIZATION_DIR, scan_samples,
+    transcribe_files, analyze_files, visualize_files, patch_json, load_visualization_helpers
+)
+
+HEAVY_MODULES = ["librosa", "matplotlib", "pretty_midi", "basic_pitch"]
+
+def audio_only(paths):
+    return [p for p in paths if Path(p).suffix.lower() in AUDIO_EXTENSIONS]
+
+def write_outputs(element_analysis, visualization_data):
+    """Patch the analysis outputs in place so other elements are kept."""
+    patch_json(DATA_DIR / "element_analysis.json", element_analysis)
+    patch_json(DATA_DIR / "visualization_data.json", visualization_data)
+
+def analyze(args, image_dir):
+    """Analyze serially, or through the memory-aware scheduler when --jobs is given."""
+    if not args.jobs:
+        return analyze_files(args.files, image_dir)
+
+    from scheduler import run_scheduled, print_report
+    element_analysis, visualization_data, report = run_scheduled(
+        args.files, image_dir, workers=args.jobs, memory_budget=args.memory_budget * 1024 ** 2,
+        image_settings=get_image_writer().settings()
+    )
+    print_report(report)
+    return element_analysis, visualization_data
+
+def command_analyze(args):
+    if args.features_only:
+        element_analysis, _ = analyze(args, image_dir=None)
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(element_analysis, f, cls=load_visualization_helpers().NumpyEncoder, indent=4)
+        print(f"Features of {len(element_analysis)} files saved to {args.output}")
+        return
+
+    element_analysis, visualization_data = analyze(args, IMAGE_DIR)
+    write_outputs(element_analysis, visualization_data)
+    print(f"Analysis of {len(element_analysis)} files saved to {DATA_DIR}")
+
+def command_visualize(args):
+    metadata = visualize_files(args.files, VISUALIZATION_DIR)
+    patch_json(VISUALIZATION_DIR / "visualization_metadata.json", metadata,
+               cls=load_visualization_helpers().NumpyEncoder)
+    print(f"Visualizations for {len(metadata)} files saved to {VISUALIZATION_DIR}")
+
+def command_transcribe(args):
+    midi_files = transcribe_files(audio_only(args.files))
+    print(f"Transcribed {len(midi_files)} files")
+
+def command_run(args):
+    """Transcription, then analysis, then visualization, for the given files."""
+    files = list(args.files)
+    for midi_file in transcribe_files(audio_only(files)):
+        if str(midi_file) not in files:
+            files.append(str(midi_file))
+
+    element_analysis, visualization_data = analyze_files(files, IMAGE_DIR)
+    write_outputs(element_analysis, visualization_data)
+
+    metadata = visualize_files(files, VISUALIZATION_DIR)
+    patch_json(VISUALIZATION_DIR / "visualization_metadata.json", metadata,
+               cls=load_visualization_helpers().NumpyEncoder)
+    print(f"Processed {len(files)} files")
+
+def print_stats(start_time):
+    """Report wall time, memory high-water mark, figure reuse and which heavy modules were imported."""
+    from render import get_renderer
+
+    loaded = [name for name in HEAVY_MODULES if name in sys.modules]
+    stats = get_renderer().memory_stats()
+    images = get_image_writer().stats()
+    message = f"Elapsed {time.time() - start_time:.2f}s"
+    if stats["peak_rss"] is not None:
+        message += f", peak RSS {stats['peak_rss'] / 1024 ** 2:.0f} MB"
+    message += f", {stats['renders']} renders on {stats['figures_created']} figures"
+    if images["frames"]:
+        message += (f", {images['frames']} images ({images['bytes_written'] / 1024 ** 2:.1f} MB) "
+                    f"encoded in {images['encode_time']:.2f}s, {images['queue_wait_time']:.2f}s waiting on the queue")
+    message += f", heavy modules loaded: {', '.join(loaded) if loaded else 'none'}"
+    print(message, file=sys.stderr)
+
+def main():
+    start_time = time.time()
+
+    parser = argparse.ArgumentParser(description="Angel visualizer analysis pipeline")
+    parser.add_argument("--stats", action="store_true",
+                        help="Print elapsed time, peak memory and loaded modules")
+    parser.add_argument("--image-format", choices=list(FORMATS), default=DEFAULT_SETTINGS["format"],
+                        help="Format of rendered images")
+    parser.add_argument("--compress-level", type=int, default=DEFAULT_SETTINGS["compress_level"],
+                        help="PNG compression level, 0 (fastest) to 9 (smallest)")
+    parser.add_argument("--palette-colors", type=int, default=DEFAULT_SETTINGS["palette_colors"],
+                        help="Palette size for flat images such as rhythm grids (0 disables quantization)")
+    parser.add_argument("--encode-workers", type=int, default=DEFAULT_SETTINGS["workers"],
+                        help="Threads encoding images in the background")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    analyze = subparsers.add_parser("analyze", help="Analyze and classify samples")
+    analyze.add_argument("--features-only", action="store_true",
+                         help="Only compute features: no images and no matplotlib import")
+    analyze.add_argument("--output", default=str(DATA_DIR / "element_features.json"),
+                         help="Where --features-only writes its JSON (published outputs are left untouched)")
+    analyze.add_argument("--jobs", type=int, default=None,
+                         help="Analyze in parallel on this many worker processes, longest files first")
+    analyze.add_argument("--memory-budget", type=int, default=2048,
+                         help="With --jobs, cap the estimated memory of the workers and their running jobs (MB)")
+    analyze.set_defaults(handler=command_analyze)
+
+    visualize = subparsers.add_parser("visualize", help="Generate specialized visualizations")
+    visualize.set_defaults(handler=command_visualize)
+
+    transcribe = subparsers.add_parser("transcribe", help="Transcribe audio samples to MIDI")
+    transcribe.set_defaults(handler=command_transcribe)
+
+    run = subparsers.add_parser("run", help="Transcribe, analyze and visualize")
+    run.set_defaults(handler=command_run)
+
+    for subparser in [analyze, visualize, transcribe, run]:
+        subparser.add_argument("files", nargs="*", help="Sample files (default: all samples)")
+
+    args = parser.parse_args()
+    if not args.files:
+        args.files = scan_samples()
+
+    configure_image_writer(format=args.image_format, compress_level=args.compress_level,
+                           palette_colors=args.palette_colors, workers=args.encode_workers)
+    args.handler(args)
+    get_image_writer().close()
+
+    if args.stats:
+        print_stats(start_time)
+
+if __name__ == "__main__":
+    main()
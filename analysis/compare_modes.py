@@ -0,0 +1,280 @@
+"""
+Speed/accuracy comparison of the reference and fast analysis modes.
+
+Every audio file of a corpus is run through analyze_audio_file and the
+specialized break/bass visualizations once per mode, and the fast results are
+scored against the reference ones:
+
+    tempo             absolute error in BPM, and the error after allowing for
+                      half/double tempo octave mistakes
+    onsets            F-measure of the onset times (50 ms window) and the
+                      difference in onset_count
+    grids             Pearson correlation of rhythm_pattern, segment_strengths
+                      and bass_movement, plus bass_movement error in semitones
+    time              median wall time of each mode and the resulting speedup
+
+Images are rendered into throwaway directories so rendering is part of the
+timing, as it is in production, and every file gets the visualizations
+visualize_audio_file would render for it. Each mode first runs once untimed
+on a file of every visualization type, so numba compilation, lazy imports
+and figure creation are not charged to whichever mode happens to run first.
+The timed runs then alternate between the modes and the median is reported.
+Usage:
+
+    python compare_modes.py [files...] [--fast sr=22050 n_mels=64 ...] [--repeats N]
+"""
+import argparse
+import json
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from analyze_elements import analyze_audio_file
+from image_writer import get_image_writer
+from pipeline import AUDIO_EXTENSIONS, DATA_DIR, scan_samples, load_visualization_helpers
+
+# Keyword arguments of analyze_audio_file and the visualization generators
+REFERENCE_MODE = {}
+FAST_MODE = {
+    "sr": 22050,
+    "n_mels": 64,
+    "fast_tempo": True,
+    "pitch_hop": 1024
+}
+
+ANALYSIS_KEYS = {"sr", "n_mels", "fast_tempo"}
+BREAK_KEYS = {"sr", "n_mels"}
+BASS_KEYS = {"sr", "pitch_hop"}
+
+ONSET_WINDOW = 0.05
+REPEATS = 3
+
+def parse_mode(pairs):
+    """Turn ["sr=22050", "fast_tempo=true"] into keyword arguments."""
+    mode = {}
+    for pair in pairs:
+        key, value = pair.split("=", 1)
+        if key not in ANALYSIS_KEYS | BREAK_KEYS | BASS_KEYS:
+            raise ValueError(f"Unknown mode setting: {key}")
+        if value.lower() in ("true", "false"):
+            mode[key] = value.lower() == "true"
+        elif value.lower() == "none":
+            mode[key] = None
+        else:
+            mode[key] = int(value)
+    return mode
+
+def run_mode(audio_file, mode):
+    """Analyze and visualize one file with the given settings. Returns (results, elapsed)."""
+    helpers = load_visualization_helpers()
+    subset = lambda keys: {k: v for k, v in mode.items() if k in keys}
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        start_time = time.time()
+        results = {"analysis": analyze_audio_file(audio_file, output_dir, **subset(ANALYSIS_KEYS))}
+        # Same choice as visualize_audio_file: other samples get the break visualizations
+        if helpers.audio_visualization_type(audio_file) == "bass":
+            results["bass"] = helpers.generate_bass_visualization(audio_file, output_dir, **subset(BASS_KEYS))
+        else:
+            results["break"] = helpers.generate_break_visualization(audio_file, output_dir, **subset(BREAK_KEYS))
+        # Encoding is part of the cost, and must finish before the directory goes away
+        get_image_writer().flush()
+        elapsed = time.time() - start_time
+
+    return results, elapsed
+
+def onset_f_measure(reference, estimated, window=ONSET_WINDOW):
+    """
+    F-measure of estimated onset times against reference ones, each reference
+    onset matching at most one estimate within the window.
+    """
+    reference = np.sort(np.asarray(reference, dtype=float))
+    estimated = np.sort(np.asarray(estimated, dtype=float))
+    if len(reference) == 0 and len(estimated) == 0:
+        return 1.0
+    if len(reference) == 0 or len(estimated) == 0:
+        return 0.0
+
+    # Greedy matching in time order is exact for sorted onsets further apart than the window
+    matched = 0
+    j = 0
+    for t in reference:
+        while j < len(estimated) and estimated[j] < t - window:
+            j += 1
+        if j < len(estimated) and abs(estimated[j] - t) <= window:
+            matched += 1
+            j += 1
+
+    precision = matched / len(estimated)
+    recall = matched / len(reference)
+    return 2 * precision * recall / (precision + recall) if matched else 0.0
+
+def correlation(a, b):
+    """Pearson correlation of two equal-length grids (None if undefined)."""
+    a = np.asarray(a, dtype=float)
+    b = np.asarray(b, dtype=float)
+    if len(a) != len(b) or len(a) < 2 or np.std(a) == 0 or np.std(b) == 0:
+        return None
+    return float(np.corrcoef(a, b)[0, 1])
+
+def tempo_errors(reference, estimated):
+    """Absolute BPM error, and the smallest error allowing for half/double tempo."""
+    error = abs(estimated - reference)
+    octave_error = min(abs(estimated * factor - reference) for factor in (0.5, 1, 2))
+    return float(error), float(octave_error)
+
+def semitone_error(reference, estimated):
+    """Mean absolute pitch difference in semitones where both contours are voiced."""
+    reference = np.asarray(reference, dtype=float)
+    estimated = np.asarray(estimated, dtype=float)
+    if len(reference) != len(estimated):
+        return None
+    voiced = (reference > 0) & (estimated > 0)
+    if not voiced.any():
+        return None
+    return float(np.mean(np.abs(12 * np.log2(estimated[voiced] / reference[voiced]))))
+
+def compare_file(reference, fast):
+    """Per-feature errors of a fast run against the reference run of the same file."""
+    metrics = {}
+    ref, est = reference["analysis"], fast["analysis"]
+    if "error" in ref or "error" in est:
+        return {"error": ref.get("error") or est.get("error")}
+
+    metrics["tempo_error"], metrics["tempo_octave_error"] = tempo_errors(ref["tempo"], est["tempo"])
+    metrics["onset_f_measure"] = onset_f_measure(ref["onset_times"], est["onset_times"])
+    metrics["onset_count_diff"] = est["onset_count"] - ref["onset_count"]
+    metrics["rhythm_pattern_correlation"] = correlation(ref["rhythm_pattern"], est["rhythm_pattern"])
+
+    if "break" in reference and "error" not in reference["break"] and "error" not in fast["break"]:
+        metrics["segment_strengths_correlation"] = correlation(
+            reference["break"]["segment_strengths"], fast["break"]["segment_strengths"]
+        )
+    if "bass" in reference and "error" not in reference["bass"] and "error" not in fast["bass"]:
+        metrics["bass_movement_correlation"] = correlation(
+            reference["bass"]["bass_movement"], fast["bass"]["bass_movement"]
+        )
+        metrics["bass_movement_semitone_error"] = semitone_error(
+            reference["bass"]["bass_movement"], fast["bass"]["bass_movement"]
+        )
+
+    return metrics
+
+def summarize(files):
+    """Mean, median and worst value of every metric across the corpus."""
+    summary = {}
+    # Files whose analysis failed only carry an "error" entry and are left out
+    keys = sorted({key for result in files.values() for key in result.get("metrics", {})} - {"error"})
+    for key in keys:
+        values = [result["metrics"][key] for result in files.values()
+                  if result.get("metrics", {}).get(key) is not None]
+        if not values:
+            continue
+        values = np.asarray(values, dtype=float)
+        # Worst is the largest error or the lowest score
+        worst = np.min(values) if key.endswith(("correlation", "f_measure")) else np.max(np.abs(values))
+        summary[key] = {
+            "mean": float(np.mean(values)),
+            "median": float(np.median(values)),
+            "worst": float(worst),
+            "files": len(values)
+        }
+
+    reference_time = sum(result["reference_time"] for result in files.values())
+    fast_time = sum(result["fast_time"] for result in files.values())
+    summary["time"] = {
+        "reference": reference_time,
+        "fast": fast_time,
+        "speedup": reference_time / fast_time if fast_time > 0 else None
+    }
+    return summary
+
+def warm_up(audio_files, modes):
+    """Run every mode once, untimed, on the first file of each visualization type."""
+    helpers = load_visualization_helpers()
+    first_of_type = {}
+    for audio_file in audio_files:
+        first_of_type.setdefault(helpers.audio_visualization_type(audio_file), audio_file)
+    for audio_file in first_of_type.values():
+        print(f"Warming up on {audio_file}...")
+        for mode in modes:
+            run_mode(audio_file, mode)
+
+def compare_modes(audio_files, reference_mode=REFERENCE_MODE, fast_mode=FAST_MODE, repeats=REPEATS):
+    """Run both modes over the corpus and return the comparison report."""
+    warm_up(audio_files, (reference_mode, fast_mode))
+
+    files = {}
+    for audio_file in audio_files:
+        print(f"Comparing modes on {audio_file}...")
+        reference_times, fast_times = [], []
+        # Alternate the modes so drift (thermal, cache, background load) hits both alike
+        for _ in range(repeats):
+            reference, elapsed = run_mode(audio_file, reference_mode)
+            reference_times.append(elapsed)
+            fast, elapsed = run_mode(audio_file, fast_mode)
+            fast_times.append(elapsed)
+
+        reference_time = float(np.median(reference_times))
+        fast_time = float(np.median(fast_times))
+        files[Path(audio_file).stem] = {
+            "reference_time": reference_time,
+            "fast_time": fast_time,
+            "reference_times": reference_times,
+            "fast_times": fast_times,
+            "speedup": reference_time / fast_time if fast_time > 0 else None,
+            "metrics": compare_file(reference, fast)
+        }
+
+    return {
+        "reference_mode": reference_mode,
+        "fast_mode": fast_mode,
+        "onset_window": ONSET_WINDOW,
+        "repeats": repeats,
+        "files": files,
+        "summary": summarize(files)
+    }
+
+def print_summary(report):
+    summary = report["summary"]
+    timing = summary["time"]
+    print(f"\nFast mode {report['fast_mode']} on {len(report['files'])} files "
+          f"(median of {report['repeats']} runs)")
+    speedup = f"{timing['speedup']:.2f}x" if timing["speedup"] else "n/a"
+    print(f"- Time: {timing['reference']:.1f}s reference, {timing['fast']:.1f}s fast ({speedup})")
+    print(f"  {'metric':<32}{'mean':>10}{'median':>10}{'worst':>10}{'files':>7}")
+    for key, stats in summary.items():
+        if key == "time":
+            continue
+        print(f"  {key:<32}{stats['mean']:>10.3f}{stats['median']:>10.3f}"
+              f"{stats['worst']:>10.3f}{stats['files']:>7}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare fast analysis settings against the reference")
+    parser.add_argument("files", nargs="*", help="Audio files (default: all audio samples)")
+    parser.add_argument("--fast", nargs="+", metavar="KEY=VALUE",
+                        help=f"Fast mode settings (default: {' '.join(f'{k}={v}' for k, v in FAST_MODE.items())})")
+    parser.add_argument("--output", default=str(DATA_DIR / "mode_comparison.json"),
+                        help="Where the full report is written")
+    parser.add_argument("--repeats", type=int, default=REPEATS,
+                        help="Timed runs of each mode per file; the median is reported")
+    args = parser.parse_args()
+    if args.repeats < 1:
+        parser.error("--repeats must be at least 1")
+
+    files = args.files or [p for p in scan_samples() if Path(p).suffix.lower() in AUDIO_EXTENSIONS]
+    fast_mode = parse_mode(args.fast) if args.fast else FAST_MODE
+
+    report = compare_modes(files, fast_mode=fast_mode, repeats=args.repeats)
+
+    Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, cls=load_visualization_helpers().NumpyEncoder, indent=4)
+
+    print_summary(report)
+    print(f"Report saved to {args.output}")
+
+if __name__ == "__main__":
+    main()
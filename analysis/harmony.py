@@ -0,0 +1,304 @@
+"""
+Key, chroma and chord analysis of transcribed MIDI.
+
+Notes are folded into a beat-synchronous chroma matrix (12 pitch classes x
+beats): every note adds its velocity-weighted overlap with each beat to its
+pitch class. The overlaps are accumulated with scatter-adds over all notes at
+once, so cost does not depend on a Python loop over notes or on truncating
+long transcriptions.
+
+Each beat is then labelled by matrix-template matching:
+    chords  cosine similarity against binary templates of 6 chord qualities
+            in all 12 roots; beats with almost no sounding notes are "N"
+    keys    Pearson correlation of a window of beats against the 24
+            Krumhansl-Kessler major/minor profiles (the whole file for the
+            global key)
+
+In batch mode the chroma of every file in the library is concatenated and
+scored with one matrix product per template set. Runs of equal labels are
+merged into chord and key timelines written to ../data/harmony_analysis.json.
+"""
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+PITCH_NAMES = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
+
+# Krumhansl-Kessler key profiles, tonic first
+MAJOR_PROFILE = np.array([6.35, 2.23, 3.48, 2.33, 4.38, 4.09, 2.52, 5.19, 2.39, 3.66, 2.29, 2.88])
+MINOR_PROFILE = np.array([6.33, 2.68, 3.52, 5.38, 2.60, 3.53, 2.54, 4.75, 3.98, 2.69, 3.34, 3.17])
+
+# Chord qualities as intervals above the root
+CHORD_QUALITIES = {
+    "": [0, 4, 7],
+    "m": [0, 3, 7],
+    "dim": [0, 3, 6],
+    "7": [0, 4, 7, 10],
+    "m7": [0, 3, 7, 10],
+    "maj7": [0, 4, 7, 11]
+}
+
+# Beats whose mean velocity-weighted number of sounding notes is below this are "N"
+MIN_ACTIVITY = 0.1
+# Beats on either side of a beat used for its local key
+KEY_WINDOW = 8
+
+def _rotations(profile):
+    """Rows are the profile transposed to each of the 12 roots."""
+    return np.stack([np.roll(profile, root) for root in range(12)])
+
+def _build_templates():
+    key_templates = np.vstack([_rotations(MAJOR_PROFILE), _rotations(MINOR_PROFILE)])
+    key_labels = [f"{name} major" for name in PITCH_NAMES] + [f"{name} minor" for name in PITCH_NAMES]
+    # Centred and unit length, so a dot product with a normalized chroma is a correlation
+    key_templates = key_templates - key_templates.mean(axis=1, keepdims=True)
+    key_templates /= np.linalg.norm(key_templates, axis=1, keepdims=True)
+
+    chord_templates = []
+    chord_labels = []
+    for quality, intervals in CHORD_QUALITIES.items():
+        template = np.zeros(12)
+        template[intervals] = 1
+        chord_templates.append(_rotations(template))
+        chord_labels += [f"{name}{quality}" for name in PITCH_NAMES]
+    chord_templates = np.vstack(chord_templates)
+    chord_templates /= np.linalg.norm(chord_templates, axis=1, keepdims=True)
+
+    return key_templates, key_labels, chord_templates, chord_labels
+
+KEY_TEMPLATES, KEY_LABELS, CHORD_TEMPLATES, CHORD_LABELS = _build_templates()
+
+def note_arrays(midi_data):
+    """
+    Return (starts, ends, pitches, velocities) arrays of all pitched notes.
+    Drum tracks carry no harmony and are skipped.
+    """
+    notes = [(note.start, note.end, note.pitch, note.velocity)
+             for instrument in midi_data.instruments if not instrument.is_drum
+             for note in instrument.notes]
+    if not notes:
+        return tuple(np.zeros(0) for _ in range(4))
+    starts, ends, pitches, velocities = np.array(notes, dtype=float).T
+    return starts, ends, pitches.astype(int), velocities
+
+def beat_boundaries(midi_data, end_time, subdivisions=1):
+    """
+    Beat times from the MIDI tempo map as frame boundaries covering [0, end_time],
+    optionally split into equal subdivisions.
+    """
+    beats = np.asarray(midi_data.get_beats(), dtype=float)
+    beats = beats[beats < end_time]
+    if len(beats) == 0 or beats[0] > 0:
+        beats = np.insert(beats, 0, 0.0)
+    boundaries = np.append(beats, end_time)
+
+    if subdivisions > 1:
+        steps = np.arange(subdivisions) / subdivisions
+        starts = boundaries[:-1, None] + np.diff(boundaries)[:, None] * steps
+        boundaries = np.append(starts.ravel(), end_time)
+
+    return boundaries
+
+def beat_chroma(starts, ends, pitches, velocities, boundaries):
+    """
+    Velocity-weighted seconds each pitch class sounds within each frame,
+    as a 12 x frames matrix.
+    """
+    n_frames = len(boundaries) - 1
+    chroma = np.zeros((12, n_frames))
+
+    starts = np.clip(starts, boundaries[0], boundaries[-1])
+    ends = np.clip(ends, boundaries[0], boundaries[-1])
+    keep = ends > starts
+    if n_frames == 0 or not keep.any():
+        return chroma
+
+    starts, ends = starts[keep], ends[keep]
+    pitch_classes = pitches[keep] % 12
+    weights = velocities[keep] / 127.0
+
+    # Frame of each note's onset and of its release
+    first = np.clip(np.searchsorted(boundaries, starts, side="right") - 1, 0, n_frames - 1)
+    last = np.clip(np.searchsorted(boundaries, ends, side="left") - 1, 0, n_frames - 1)
+
+    # Notes within one frame
+    within = first == last
+    np.add.at(chroma, (pitch_classes[within], first[within]),
+              weights[within] * (ends[within] - starts[within]))
+
+    # Notes spanning frames: partial first and last frames...
+    span = ~within
+    pc, w, f, l = pitch_classes[span], weights[span], first[span], last[span]
+    np.add.at(chroma, (pc, f), w * (boundaries[f + 1] - starts[span]))
+    np.add.at(chroma, (pc, l), w * (ends[span] - boundaries[l]))
+
+    # ...and every frame in between in full, via a difference array over frames
+    active = np.zeros((12, n_frames + 1))
+    np.add.at(active, (pc, f + 1), w)
+    np.add.at(active, (pc, l), -w)
+    chroma += np.cumsum(active, axis=1)[:, :n_frames] * np.diff(boundaries)
+
+    return chroma
+
+def window_sum(chroma, radius):
+    """Sum of each frame with up to radius frames on either side."""
+    n_frames = chroma.shape[1]
+    cumulative = np.pad(np.cumsum(chroma, axis=1), ((0, 0), (1, 0)))
+    index = np.arange(n_frames)
+    low = np.maximum(index - radius, 0)
+    high = np.minimum(index + radius + 1, n_frames)
+    return cumulative[:, high] - cumulative[:, low]
+
+def key_scores(chroma):
+    """Correlation of every column with every key profile (24 x frames)."""
+    centred = chroma - chroma.mean(axis=0, keepdims=True)
+    norms = np.linalg.norm(centred, axis=0, keepdims=True)
+    return KEY_TEMPLATES @ (centred / np.where(norms > 0, norms, 1))
+
+def chord_scores(chroma):
+    """Cosine similarity of every column with every chord template (72 x frames)."""
+    norms = np.linalg.norm(chroma, axis=0, keepdims=True)
+    return CHORD_TEMPLATES @ (chroma / np.where(norms > 0, norms, 1))
+
+def merge_runs(labels, confidences, boundaries, names, label_key):
+    """Merge consecutive frames with the same label into timeline segments."""
+    if len(labels) == 0:
+        return []
+    run_starts = np.concatenate([[0], np.flatnonzero(np.diff(labels)) + 1])
+    run_ends = np.append(run_starts[1:], len(labels))
+    mean_confidence = np.add.reduceat(confidences, run_starts) / (run_ends - run_starts)
+
+    return [
+        {
+            "start": float(boundaries[start]),
+            "end": float(boundaries[end]),
+            label_key: names[labels[start]],
+            "confidence": round(float(confidence), 3)
+        }
+        for start, end, confidence in zip(run_starts, run_ends, mean_confidence)
+    ]
+
+def harmony_from_notes(items):
+    """
+    Analyze a batch of files given as (notes, boundaries) pairs, where notes is
+    the (starts, ends, pitches, velocities) tuple from note_arrays.
+    Returns one result per item.
+    """
+    chromas = [beat_chroma(*notes, boundaries) for notes, boundaries in items]
+    offsets = np.cumsum([0] + [chroma.shape[1] for chroma in chromas])
+
+    # Score the whole library at once: one matrix product per template set
+    all_chroma = np.hstack(chromas) if chromas else np.zeros((12, 0))
+    local_chroma = np.hstack([window_sum(chroma, KEY_WINDOW) for chroma in chromas]) if chromas else all_chroma
+    all_chord_scores = chord_scores(all_chroma)
+    all_key_scores = key_scores(local_chroma)
+    global_key_scores = key_scores(np.stack([chroma.sum(axis=1) for chroma in chromas], axis=1)) if chromas else None
+
+    no_chord = len(CHORD_LABELS)
+    chord_names = CHORD_LABELS + ["N"]
+
+    results = []
+    for index, ((_, boundaries), chroma) in enumerate(zip(items, chromas)):
+        frames = slice(offsets[index], offsets[index + 1])
+        if chroma.shape[1] == 0 or not chroma.any():
+            results.append({"error": "No pitched notes found"})
+            continue
+
+        durations = np.diff(boundaries)
+        activity = chroma.sum(axis=0) / np.where(durations > 0, durations, 1)
+
+        scores = all_chord_scores[:, frames]
+        chords = np.argmax(scores, axis=0)
+        chord_confidence = scores[chords, np.arange(len(chords))]
+        chords = np.where(activity >= MIN_ACTIVITY, chords, no_chord)
+        chord_confidence = np.where(chords == no_chord, 0.0, chord_confidence)
+
+        scores = all_key_scores[:, frames]
+        keys = np.argmax(scores, axis=0)
+        key_confidence = scores[keys, np.arange(len(keys))]
+
+        global_key = int(np.argmax(global_key_scores[:, index]))
+        profile = chroma.sum(axis=1)
+
+        results.append({
+            "key": KEY_LABELS[global_key],
+            "key_confidence": round(float(global_key_scores[global_key, index]), 3),
+            "beat_count": int(chroma.shape[1]),
+            "chroma_profile": (profile / profile.max()).round(3).tolist(),
+            "chord_timeline": merge_runs(chords, chord_confidence, boundaries, chord_names, "chord"),
+            "key_timeline": merge_runs(keys, key_confidence, boundaries, KEY_LABELS, "key")
+        })
+
+    return results
+
+def analyze_harmony(midi_data, subdivisions=1):
+    """Key, chord and key timelines of one loaded PrettyMIDI object."""
+    notes = note_arrays(midi_data)
+    boundaries = beat_boundaries(midi_data, midi_data.get_end_time(), subdivisions)
+    return harmony_from_notes([(notes, boundaries)])[0]
+
+def load_notes(midi_file, subdivisions=1):
+    """Read a MIDI file into (notes, boundaries) (runs in a worker process)."""
+    import pretty_midi
+
+    midi_data = pretty_midi.PrettyMIDI(str(midi_file))
+    return note_arrays(midi_data), beat_boundaries(midi_data, midi_data.get_end_time(), subdivisions)
+
+def analyze_library(midi_files, workers=None, subdivisions=1):
+    """
+    Harmony of every MIDI file, keyed by element name. Files are parsed in
+    parallel and then scored together in one batch.
+    """
+    names = [Path(midi_file).stem for midi_file in midi_files]
+    items = {}
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {name: executor.submit(load_notes, midi_file, subdivisions)
+                   for name, midi_file in zip(names, midi_files)}
+        errors = {}
+        for name, future in futures.items():
+            try:
+                items[name] = future.result()
+            except Exception as e:
+                print(f"Error loading {name}: {e}")
+                errors[name] = {"error": str(e)}
+
+    loaded = list(items)
+    results = dict(zip(loaded, harmony_from_notes([items[name] for name in loaded])))
+    results.update(errors)
+    return {name: results[name] for name in names}
+
+def main():
+    from pipeline import MIDI_EXTENSIONS, scan_samples
+
+    parser = argparse.ArgumentParser(description="Estimate key and chord timelines of MIDI transcriptions")
+    parser.add_argument("files", nargs="*", help="MIDI files (default: all MIDI samples)")
+    parser.add_argument("--output", default="../data/harmony_analysis.json",
+                        help="Where to write the harmony analysis JSON")
+    parser.add_argument("--subdivisions", type=int, default=1,
+                        help="Chroma frames per beat")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Number of worker processes parsing MIDI (default: CPU count)")
+    args = parser.parse_args()
+
+    files = args.files or [p for p in scan_samples() if Path(p).suffix.lower() in MIDI_EXTENSIONS]
+    harmony = analyze_library(files, workers=args.workers, subdivisions=args.subdivisions)
+
+    output_path = Path(args.output)
+    os.makedirs(output_path.parent, exist_ok=True)
+    with open(output_path, "w") as f:
+        json.dump(harmony, f, indent=4)
+
+    for name, result in harmony.items():
+        if "error" in result:
+            print(f"- {name}: {result['error']}")
+        else:
+            print(f"- {name}: {result['key']} ({len(result['chord_timeline'])} chord segments)")
+    print(f"Harmony analysis complete! Results saved to {output_path}")
+
+if __name__ == "__main__":
+    main()
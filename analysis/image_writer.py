@@ -0,0 +1,263 @@
+"""
+Background image encoding for rendered figures.
+
+Rendering stays on the analysis thread: a figure is drawn once on its Agg
+canvas and the raw RGBA frame is copied out, so the cached figure can be
+reused immediately. Compressing that frame to PNG or WebP happens on a small
+thread pool (zlib and libwebp release the GIL) while the analysis thread
+moves on to the next plot or file. At most max_pending frames wait for
+encoding at any time; when the queue is full the analysis thread blocks, so
+memory stays bounded by max_pending frames (3-6 MB each at 150 dpi).
+
+Settings:
+    format          "png" or "webp"
+    compress_level  PNG zlib level, 0 (fastest) to 9 (smallest), default 6
+    palette_colors  colors of the palette used for flat images (rhythm grids,
+                    histograms); 0 keeps full RGBA for them too
+    webp_quality    lossy WebP quality for plots with gradients; flat images
+                    are always written as lossless WebP
+
+Frames that are also needed in memory (e.g. as base64) can be encoded with
+encode_async(); the returned future can be passed to write(), which then
+writes those bytes instead of encoding the frame a second time.
+
+Files are written to a temporary name and renamed into place, so watchers
+and the analysis server never serve a half-written image. Call flush()
+before relying on the files of a batch.
+"""
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from io import BytesIO
+
+FORMATS = {"png": ".png", "webp": ".webp"}
+
+DEFAULT_SETTINGS = {
+    "format": "png",
+    "compress_level": 6,
+    "palette_colors": 64,
+    "webp_quality": 90,
+    "workers": 2,
+    "max_pending": 8
+}
+
+_writer = None
+_writer_lock = threading.Lock()
+
+class ImageWriter:
+    """Encodes captured figure frames on a bounded background thread pool."""
+
+    def __init__(self, format="png", compress_level=6, palette_colors=64, webp_quality=90,
+                 workers=2, max_pending=8):
+        if format not in FORMATS:
+            raise ValueError(f"Unknown image format: {format}")
+        if not 0 <= compress_level <= 9:
+            raise ValueError(f"PNG compress level must be 0-9, got {compress_level}")
+        if format == "webp":
+            from PIL import features
+            if not features.check("webp"):
+                raise ValueError("This Pillow build has no WebP support")
+
+        self.format = format
+        self.compress_level = compress_level
+        self.palette_colors = palette_colors
+        self.webp_quality = webp_quality
+        self.workers = workers
+        self.max_pending = max_pending
+
+        # The pool is only started by the first write, so feature-only runs never spawn it
+        self._executor = None
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._pending = set()
+        self._lock = threading.Lock()
+
+        self.frames = 0
+        self.failures = 0
+        self.bytes_written = 0
+        self.encode_time = 0.0
+        self.queue_wait_time = 0.0
+
+    @property
+    def extension(self):
+        return FORMATS[self.format]
+
+    def capture(self, fig, dpi=None):
+        """
+        Draw a figure and return a copy of its RGBA frame, matching what
+        savefig would write at the same dpi.
+        """
+        import numpy as np
+
+        original_dpi = fig.dpi
+        if dpi is not None:
+            fig.set_dpi(dpi)
+        try:
+            fig.canvas.draw()
+            return np.array(fig.canvas.buffer_rgba())
+        finally:
+            fig.set_dpi(original_dpi)
+
+    def encode(self, rgba, flat=False, format=None):
+        """Compress a frame synchronously and return the encoded bytes."""
+        from PIL import Image
+
+        format = format or self.format
+        image = Image.fromarray(rgba)
+        buffer = BytesIO()
+
+        if format == "webp":
+            if flat:
+                image.save(buffer, "WEBP", lossless=True)
+            else:
+                image.save(buffer, "WEBP", quality=self.webp_quality)
+        else:
+            if flat and self.palette_colors:
+                # Flat plots have few distinct colors: an 8-bit palette is much smaller
+                image = image.convert("RGB").quantize(colors=self.palette_colors)
+            image.save(buffer, "PNG", compress_level=self.compress_level)
+
+        return buffer.getvalue()
+
+    def save(self, fig, output_dir, name, dpi=None, flat=False):
+        """
+        Capture a figure now and write it as output_dir/name in the background.
+        Returns the file name (with the extension of the configured format).
+        """
+        return self.write(self.capture(fig, dpi), output_dir, name, flat)
+
+    def encode_async(self, rgba, flat=False, format=None):
+        """
+        Queue a frame for encoding without writing it. Returns a future of
+        the encoded bytes, which write() accepts as encoded.
+        """
+        return self._submit(self._encode_timed, rgba, flat, format)
+
+    def write(self, rgba, output_dir, name, flat=False, encoded=None):
+        """
+        Queue an already captured frame for encoding. Returns the file name.
+        encoded may hold the frame already encoded in the configured format,
+        as bytes or a future from encode_async(), which is then written as is
+        instead of being encoded again.
+        """
+        file_name = f"{name}{self.extension}"
+        path = os.path.join(output_dir, file_name)
+
+        # Encoded frames only need the bytes, so the raw frame is not kept alive
+        future = self._submit(self._encode_to_file, None if encoded is not None else rgba,
+                              path, flat, encoded)
+        with self._lock:
+            self.frames += 1
+        future.add_done_callback(self._written)
+
+        return file_name
+
+    def _submit(self, fn, *args):
+        # Block while max_pending frames are queued, keeping memory bounded
+        wait_start = time.time()
+        self._slots.acquire()
+
+        with self._lock:
+            self.queue_wait_time += time.time() - wait_start
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers,
+                                                    thread_name_prefix="image-writer")
+            future = self._executor.submit(fn, *args)
+            self._pending.add(future)
+        future.add_done_callback(self._finished)
+        return future
+
+    def _encode_timed(self, rgba, flat, format):
+        start_time = time.time()
+        data = self.encode(rgba, flat, format)
+        with self._lock:
+            self.encode_time += time.time() - start_time
+        return data
+
+    def _encode_to_file(self, rgba, path, flat, encoded=None):
+        if isinstance(encoded, Future):
+            # Submitted before this task, so it is already running or done: no pool deadlock
+            encoded = encoded.result()
+        start_time = time.time()
+        data = encoded if encoded is not None else self.encode(rgba, flat)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        return len(data), time.time() - start_time
+
+    def _finished(self, future):
+        with self._lock:
+            self._pending.discard(future)
+        self._slots.release()
+
+    def _written(self, future):
+        with self._lock:
+            try:
+                size, elapsed = future.result()
+                self.bytes_written += size
+                self.encode_time += elapsed
+            except Exception as e:
+                self.failures += 1
+                print(f"Error writing image: {e}")
+
+    def flush(self):
+        """Wait until every queued image is on disk."""
+        with self._lock:
+            pending = list(self._pending)
+        wait(pending)
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+
+    def settings(self):
+        return {
+            "format": self.format,
+            "compress_level": self.compress_level,
+            "palette_colors": self.palette_colors,
+            "webp_quality": self.webp_quality,
+            "workers": self.workers,
+            "max_pending": self.max_pending
+        }
+
+    def stats(self):
+        return {
+            "frames": self.frames,
+            "failures": self.failures,
+            "bytes_written": self.bytes_written,
+            "encode_time": self.encode_time,
+            "queue_wait_time": self.queue_wait_time
+        }
+
+def configure_image_writer(**settings):
+    """
+    Replace the process-wide writer with one using the given settings
+    (unspecified settings keep their defaults). Pending images are flushed first.
+    """
+    global _writer
+    with _writer_lock:
+        if _writer is not None:
+            _writer.close()
+        _writer = ImageWriter(**{**DEFAULT_SETTINGS, **settings})
+        return _writer
+
+def get_image_writer():
+    """Process-wide writer, shared by every rendering thread."""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = ImageWriter(**DEFAULT_SETTINGS)
+        return _writer
+
+def _reset_after_fork():
+    # A forked worker inherits the parent's writer but none of its threads
+    global _writer, _writer_lock
+    _writer = None
+    _writer_lock = threading.Lock()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,260 @@
+"""
+Real-time analysis stream for the visualizer.
+
+Audio is read in blocks of HOP_LENGTH samples, either from a file played back at
+real-time pace or from a local audio input, and pushed through a ring buffer.
+For every block one analysis frame is computed and broadcast as JSON to the
+browser over a local WebSocket.
+
+The features follow the offline definitions in analyze_elements.py and
+visualization-helpers.py:
+- onset strength: librosa's mel spectral flux (128 mel bands, lag 1, mean over bands)
+- RMS: librosa.feature.rms over the last FRAME_LENGTH samples
+- rhythm grid: quantize_rhythm_pattern over the last --grid-seconds of onset strength
+- bass fundamental: piptrack (30-300 Hz) on the current frame, most prominent peak
+
+Offline, librosa clips the dB mel spectrogram to 80 dB below the maximum of the
+whole file; that maximum is not known while streaming, so the live onset
+strength is computed without top_db clipping.
+
+Latency budget (22050 Hz, HOP_LENGTH=512, one core):
+- block period: 512 / 22050 = 23.2 ms of audio per block
+- analysis per block must stay under 50 ms, and under the block period to keep
+  up with the input; it is one 2048-point FFT, one 128x1025 mel projection,
+  a single-frame piptrack and a 16-step interpolation, which is well inside
+  the budget on current hardware
+- the per-block processing time is measured and reported (p50/p95/max), and a
+  warning is printed whenever p95 exceeds the budget
+End-to-end latency adds the block period, the FRAME_LENGTH analysis window and
+the local WebSocket hop on top of the processing time.
+"""
+import argparse
+import asyncio
+import json
+import queue
+import threading
+import time
+
+import numpy as np
+import librosa
+import websockets
+
+from analyze_elements import quantize_rhythm_pattern, pitch_contour_from_piptrack
+
+SAMPLE_RATE = 22050
+HOP_LENGTH = 512
+FRAME_LENGTH = 2048
+N_MELS = 128
+LATENCY_BUDGET_MS = 50.0
+
+class RingBuffer:
+    """Fixed-size circular buffer of float32 samples."""
+
+    def __init__(self, size):
+        self.size = size
+        self.buffer = np.zeros(size, dtype=np.float32)
+        self.position = 0
+
+    def write(self, block):
+        block = np.asarray(block, dtype=np.float32)[-self.size:]
+        end = self.position + len(block)
+        if end <= self.size:
+            self.buffer[self.position:end] = block
+        else:
+            split = self.size - self.position
+            self.buffer[self.position:] = block[:split]
+            self.buffer[:end - self.size] = block[split:]
+        self.position = end % self.size
+
+    def latest(self):
+        """Return the buffer contents in chronological order."""
+        return np.concatenate((self.buffer[self.position:], self.buffer[:self.position]))
+
+class LiveAnalyzer:
+    """
+    Incremental version of the offline feature extraction, one frame per block.
+    """
+
+    def __init__(self, sr=SAMPLE_RATE, grid_seconds=4.0, steps=16):
+        self.sr = sr
+        self.steps = steps
+        self.samples = RingBuffer(FRAME_LENGTH)
+        self.window = librosa.filters.get_window("hann", FRAME_LENGTH, fftbins=True).astype(np.float32)
+        self.mel_basis = librosa.filters.mel(sr=sr, n_fft=FRAME_LENGTH, n_mels=N_MELS)
+        self.previous_mel_db = None
+
+        # Onset strength history covering the rhythm grid window
+        self.onset_history = RingBuffer(max(steps, int(grid_seconds * sr / HOP_LENGTH)))
+        self.frame_index = 0
+
+    def process(self, block):
+        """Analyze one block of HOP_LENGTH samples and return a feature frame."""
+        self.samples.write(block)
+        frame = self.samples.latest()
+
+        magnitude = np.abs(np.fft.rfft(frame * self.window))
+
+        # Onset strength: positive mel spectral flux, averaged over bands
+        mel_db = librosa.power_to_db(self.mel_basis @ (magnitude ** 2), top_db=None)
+        if self.previous_mel_db is None:
+            onset_strength = 0.0
+        else:
+            onset_strength = float(np.mean(np.maximum(0.0, mel_db - self.previous_mel_db)))
+        self.previous_mel_db = mel_db
+        self.onset_history.write([onset_strength])
+
+        # RMS energy over the analysis window
+        rms = float(np.sqrt(np.mean(frame ** 2)))
+
+        # Bass fundamental of the current frame
+        pitches, magnitudes = librosa.piptrack(S=magnitude[:, np.newaxis], sr=self.sr,
+                                               n_fft=FRAME_LENGTH, fmin=30, fmax=300)
+        bass_pitch = pitch_contour_from_piptrack(pitches, magnitudes)[0]
+
+        result = {
+            "frame": self.frame_index,
+            "time": float(self.frame_index * HOP_LENGTH / self.sr),
+            "onset_strength": onset_strength,
+            "rms": rms,
+            "rhythm_grid": quantize_rhythm_pattern(self.onset_history.latest(), self.steps),
+            "bass_pitch": None if np.isnan(bass_pitch) else bass_pitch
+        }
+        self.frame_index += 1
+        return result
+
+def file_blocks(audio_file, sr=SAMPLE_RATE, realtime=True):
+    """
+    Yield HOP_LENGTH blocks from an audio file, paced at real-time speed.
+    """
+    y, _ = librosa.load(audio_file, sr=sr, mono=True)
+    block_duration = HOP_LENGTH / sr
+    start_time = time.perf_counter()
+
+    for i, offset in enumerate(range(0, len(y), HOP_LENGTH)):
+        if realtime:
+            # Sleep until the block would have been captured
+            delay = start_time + (i + 1) * block_duration - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        block = y[offset:offset + HOP_LENGTH]
+        if len(block) < HOP_LENGTH:
+            block = np.pad(block, (0, HOP_LENGTH - len(block)))
+        yield block
+
+def input_blocks(sr=SAMPLE_RATE, device=None):
+    """
+    Yield HOP_LENGTH blocks from a local audio input (requires sounddevice).
+    """
+    try:
+        import sounddevice as sd
+    except ImportError:
+        raise RuntimeError("Live input requires the sounddevice package (pip install sounddevice)")
+
+    blocks = queue.Queue()
+
+    def callback(indata, frames, time_info, status):
+        if status:
+            print(f"Audio input status: {status}")
+        blocks.put(indata[:, 0].copy())
+
+    with sd.InputStream(samplerate=sr, blocksize=HOP_LENGTH, channels=1,
+                        dtype="float32", device=device, callback=callback):
+        while True:
+            yield blocks.get()
+
+def latency_report(timings_ms):
+    """Summarize per-block processing times in milliseconds."""
+    timings = np.asarray(timings_ms)
+    return {
+        "blocks": int(len(timings)),
+        "p50_ms": float(np.percentile(timings, 50)),
+        "p95_ms": float(np.percentile(timings, 95)),
+        "max_ms": float(np.max(timings)),
+        "block_period_ms": 1000.0 * HOP_LENGTH / SAMPLE_RATE
+    }
+
+def print_latency_report(timings_ms):
+    if not timings_ms:
+        return
+    report = latency_report(timings_ms)
+    print(f"Processed {report['blocks']} blocks: p50 {report['p50_ms']:.2f} ms, "
+          f"p95 {report['p95_ms']:.2f} ms, max {report['max_ms']:.2f} ms "
+          f"(budget {LATENCY_BUDGET_MS:.0f} ms, block period {report['block_period_ms']:.1f} ms)")
+    if report["p95_ms"] > LATENCY_BUDGET_MS:
+        print("Warning: p95 processing time exceeds the latency budget")
+
+def run_analysis(blocks, analyzer, publish, stop_event, report_every=10.0):
+    """
+    Analyze blocks as they arrive and hand every frame to publish.
+    Runs on its own thread so the event loop only does network I/O.
+    """
+    timings_ms = []
+    last_report = time.perf_counter()
+
+    for block in blocks:
+        if stop_event.is_set():
+            break
+
+        start = time.perf_counter()
+        frame = analyzer.process(block)
+        elapsed_ms = (time.perf_counter() - start) * 1000.0
+
+        frame["processing_ms"] = elapsed_ms
+        timings_ms.append(elapsed_ms)
+        publish(json.dumps(frame))
+
+        if time.perf_counter() - last_report > report_every:
+            print_latency_report(timings_ms[-int(report_every * SAMPLE_RATE / HOP_LENGTH):])
+            last_report = time.perf_counter()
+
+    print_latency_report(timings_ms)
+
+async def serve(blocks, analyzer, host, port):
+    clients = set()
+    loop = asyncio.get_running_loop()
+    stop_event = threading.Event()
+
+    async def handler(websocket, path=None):
+        clients.add(websocket)
+        try:
+            await websocket.wait_closed()
+        finally:
+            clients.discard(websocket)
+
+    def publish(message):
+        # Called from the analysis thread, the broadcast itself runs on the loop
+        loop.call_soon_threadsafe(lambda: websockets.broadcast(clients, message))
+
+    async with websockets.serve(handler, host, port):
+        print(f"Streaming analysis frames on ws://{host}:{port}")
+        try:
+            await loop.run_in_executor(None, run_analysis, blocks, analyzer, publish, stop_event)
+        finally:
+            stop_event.set()
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream live analysis frames to the visualizer over a WebSocket")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--file", help="Audio file to play back at real-time pace")
+    source.add_argument("--input", action="store_true", help="Analyze the local audio input")
+    parser.add_argument("--device", default=None, help="Audio input device (see python -m sounddevice)")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--grid-seconds", type=float, default=4.0,
+                        help="Length of the window summarized by the 16-step rhythm grid")
+    args = parser.parse_args()
+
+    if args.file:
+        blocks = file_blocks(args.file)
+    else:
+        blocks = input_blocks(device=args.device)
+
+    analyzer = LiveAnalyzer(grid_seconds=args.grid_seconds)
+
+    try:
+        asyncio.run(serve(blocks, analyzer, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+import importlib.util
+import json
+import os
+from pathlib import Path
+
+from analyze_elements import analyze_element, classify_element, build_visualization_element
+from image_writer import get_image_writer
+
+AUDIO_EXTENSIONS = ['.mp3', '.wav', '.ogg', '.flac']
+MIDI_EXTENSIONS = ['.mid', '.midi']
+
+SAMPLES_DIR = Path("samples")
+MIDI_DIR = Path("samples/midi")
+DATA_DIR = Path("../data")
+IMAGE_DIR = Path("../data/images")
+VISUALIZATION_DIR = Path("../data/visualizations")
+
+_visualization_helpers = None
+
+def load_visualization_helpers():
+    """
+    Import visualization-helpers.py (not importable by name because of the hyphen).
+    """
+    global _visualization_helpers
+    if _visualization_helpers is None:
+        path = Path(__file__).with_name("visualization-helpers.py")
+        spec = importlib.util.spec_from_file_location("visualization_helpers", path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        _visualization_helpers = module
+    return _visualization_helpers
+
+def is_sample(path):
+    """True for the audio and MIDI files the pipeline knows how to process."""
+    return Path(path).suffix.lower() in AUDIO_EXTENSIONS + MIDI_EXTENSIONS
+
+def scan_samples():
+    """List every sample currently in the samples directories."""
+    paths = []
+    for directory in [SAMPLES_DIR, MIDI_DIR]:
+        if directory.exists():
+            paths.extend(str(p) for p in sorted(directory.iterdir()) if p.is_file() and is_sample(p))
+    return paths
+
+def element_name(file_path):
+    """Key used for a file in the output JSON (file name up to the first dot)."""
+    return os.path.basename(str(file_path)).split(".")[0]
+
+def midi_path_for(audio_file, midi_dir=MIDI_DIR):
+    """Path basic-pitch writes the transcription of an audio file to."""
+    return Path(midi_dir) / f"{Path(audio_file).stem}_basic_pitch.mid"
+
+def transcribe_files(audio_files, midi_dir=MIDI_DIR):
+    """
+    Transcribe the given audio files to MIDI with basic-pitch.
+    Returns the paths of the MIDI files written.
+    """
+    if not audio_files:
+        return []
+
+    from basic_pitch.inference import predict_and_save
+    from basic_pitch import ICASSP_2022_MODEL_PATH
+
+    os.makedirs(midi_dir, exist_ok=True)
+
+    # basic-pitch refuses to overwrite, so drop stale transcriptions first
+    midi_files = [midi_path_for(audio_file, midi_dir) for audio_file in audio_files]
+    for midi_file in midi_files:
+        if midi_file.exists():
+            midi_file.unlink()
+
+    predict_and_save(
+        audio_path_list=[str(audio_file) for audio_file in audio_files],
+        output_directory=str(midi_dir),
+        save_midi=True,
+        sonify_midi=False,
+        save_model_outputs=False,
+        save_notes=False,
+        model_or_model_path=ICASSP_2022_MODEL_PATH
+    )
+
+    return [midi_file for midi_file in midi_files if midi_file.exists()]
+
+def analyze_files(file_paths, image_dir=IMAGE_DIR):
+    """
+    Analyze and classify the given files (no images are rendered when image_dir is None).
+    Returns (element_analysis, visualization_data) entries keyed by element name.
+    """
+    element_analysis = {}
+    visualization_data = {}
+
+    for file_path in file_paths:
+        name = element_name(file_path)
+        analysis = analyze_element(file_path, str(image_dir) if image_dir else None)
+        analysis["element_type"] = classify_element(name, analysis)
+
+        element_analysis[name] = analysis
+        visualization_data[name] = build_visualization_element(name, analysis)
+
+    # Images are encoded in the background while the next file is analyzed
+    if image_dir:
+        get_image_writer().flush()
+
+    return element_analysis, visualization_data
+
+def visualize_files(file_paths, output_dir=VISUALIZATION_DIR):
+    """
+    Generate the specialized visualizations for the given files.
+    Returns visualization metadata entries keyed by file stem.
+    """
+    helpers = load_visualization_helpers()
+    metadata = {}
+
+    for file_path in file_paths:
+        file_path = Path(file_path)
+        if file_path.suffix.lower() in MIDI_EXTENSIONS:
+            metadata[file_path.stem] = helpers.visualize_midi_file(file_path, output_dir)
+        else:
+            metadata[file_path.stem] = helpers.visualize_audio_file(file_path, output_dir)
+
+    get_image_writer().flush()
+    return metadata
+
+def patch_json(json_path, updates=None, removals=None, cls=None):
+    """
+    Update entries of a JSON object file in place, leaving all other entries untouched.
+    The file is replaced atomically so readers never see a partial write.
+    """
+    json_path = Path(json_path)
+    data = {}
+    if json_path.exists():
+        with open(json_path) as f:
+            data = json.load(f)
+
+    data.update(updates or {})
+    for key in removals or []:
+        data.pop(key, None)
+
+    os.makedirs(json_path.parent, exist_ok=True)
+    tmp_path = json_path.with_suffix(json_path.suffix + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, cls=cls, indent=4)
+    os.replace(tmp_path, json_path)
@@ -0,0 +1,258 @@
+"""
+Publish analysis outputs to the Next.js public/ directory.
+
+Every output under ../data (JSON, images, visualizations and tile sets) is
+copied to ../public/data/assets/ under a content-hashed name such as
+images/amen_break_spectrogram.1f3a9c0b2d4e.png, so it can be served with
+immutable caching. JSON and binary sidecars also get .gz and .br
+precompressed variants next to them (brotli needs the optional brotli
+package). ../public/data/asset-manifest.json maps each logical name (its
+path relative to ../data) to the hashed URL; the manifest itself keeps a
+fixed name and must be revalidated by clients.
+
+Because names are derived from content, an unchanged file maps to a file that
+is already published and is skipped on republish.
+
+Spectrogram tile sets are versioned as a whole, because the frontend
+addresses tiles by position ({zoom}/{x}/{y}.png): each ../data/tiles/{name}/{kind}
+set is copied to ../public/data/tiles/{name}/{kind}/{hash}/, hashed over all
+of its files, and the manifest maps tiles/{name}/{kind} to that directory.
+A rebuilt pyramid therefore gets new URLs, and its tiles can be cached as
+immutably as the other assets.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import shutil
+from pathlib import Path
+
+DATA_DIR = Path("../data")
+PUBLIC_DATA_DIR = Path("../public/data")
+ASSET_DIR_NAME = "assets"
+MANIFEST_NAME = "asset-manifest.json"
+TILE_DIR_NAME = "tiles"
+TILE_EXTENSIONS = {".png", ".json"}
+
+# Outputs worth publishing; cached tile levels (.npy) and watch state stay private
+PUBLISHED_EXTENSIONS = {".json", ".png", ".webp", ".bin", ".mid"}
+# Formats that are not already compressed get .gz/.br variants
+COMPRESSIBLE_EXTENSIONS = {".json", ".bin", ".mid"}
+HASH_LENGTH = 12
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+def content_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def find_outputs(data_dir=DATA_DIR):
+    """List publishable outputs as logical names relative to the data directory."""
+    outputs = []
+    for path in sorted(Path(data_dir).rglob("*")):
+        if not path.is_file() or path.name.startswith("."):
+            continue
+        relative = path.relative_to(data_dir)
+        # Tiles are published to fixed paths by publish_tiles
+        if relative.parts[0] == TILE_DIR_NAME or path.suffix.lower() not in PUBLISHED_EXTENSIONS:
+            continue
+        outputs.append(relative.as_posix())
+    return outputs
+
+def find_tile_sets(data_dir=DATA_DIR):
+    """
+    List tile sets as (logical name, {relative path: source path}), the
+    logical name being tiles/{name}/{kind}. Cached .npy levels stay private.
+    """
+    tile_sets = []
+    for manifest in sorted((Path(data_dir) / TILE_DIR_NAME).glob("*/*/manifest.json")):
+        source_dir = manifest.parent
+        # Hidden siblings are pyramids being built or swapped out by spectrogram_tiles.py
+        if source_dir.name.startswith("."):
+            continue
+        files = {}
+        for path in sorted(source_dir.rglob("*")):
+            relative = path.relative_to(source_dir)
+            if path.is_file() and "levels" not in relative.parts and path.suffix.lower() in TILE_EXTENSIONS:
+                files[relative.as_posix()] = path
+        tile_sets.append((source_dir.relative_to(data_dir).as_posix(), files))
+    return tile_sets
+
+def tile_set_hash(files):
+    """Hash of a tile set over the names and contents of all its files."""
+    digest = hashlib.sha256()
+    for relative, path in sorted(files.items()):
+        digest.update(f"{relative}\0{content_hash(path)}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+def publish_tiles(data_dir=DATA_DIR, public_dir=PUBLIC_DATA_DIR, previous=None):
+    """
+    Copy every tile set to a directory named after its hash under public/.
+    Returns ({logical name: manifest entry}, published, skipped).
+    """
+    previous = previous or {}
+    entries = {}
+    published = skipped = 0
+
+    for logical_name, files in find_tile_sets(data_dir):
+        digest = tile_set_hash(files)
+        version = digest[:HASH_LENGTH]
+        target_dir = Path(public_dir) / logical_name / version
+        entry = {
+            "url": f"/data/{logical_name}/{version}",
+            "hash": digest,
+            "size": sum(path.stat().st_size for path in files.values()),
+            "encodings": []
+        }
+        entries[logical_name] = entry
+
+        if target_dir.exists() and previous.get(logical_name, {}).get("hash") == digest:
+            skipped += 1
+            continue
+
+        # Copy next to the target and rename, so a version directory is never half-filled
+        tmp_dir = target_dir.with_name(f"{version}.tmp")
+        if tmp_dir.exists():
+            shutil.rmtree(tmp_dir)
+        for relative, source in files.items():
+            target = tmp_dir / relative
+            os.makedirs(target.parent, exist_ok=True)
+            shutil.copyfile(source, target)
+        if target_dir.exists():
+            shutil.rmtree(target_dir)
+        os.replace(tmp_dir, target_dir)
+        published += 1
+
+    return entries, published, skipped
+
+def hashed_name(logical_name, digest):
+    path = Path(logical_name)
+    return (path.parent / f"{path.stem}.{digest[:HASH_LENGTH]}{path.suffix}").as_posix()
+
+def write_compressed(path):
+    """
+    Write .gz and .br variants of path when they are smaller than the original.
+    Returns the encodings written.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+
+    encodings = []
+    # mtime=0 keeps the gzip output identical across republishes
+    variants = [("gzip", ".gz", lambda d: gzip.compress(d, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append(("br", ".br", lambda d: brotli.compress(d, quality=11)))
+
+    for encoding, suffix, compress in variants:
+        compressed = compress(data)
+        if len(compressed) < len(data):
+            with open(f"{path}{suffix}", "wb") as f:
+                f.write(compressed)
+            encodings.append(encoding)
+
+    return encodings
+
+def publish(data_dir=DATA_DIR, public_dir=PUBLIC_DATA_DIR, prune=False):
+    """
+    Copy outputs into public/ under hashed names and write the asset manifest.
+    Returns (manifest, stats).
+    """
+    asset_dir = Path(public_dir) / ASSET_DIR_NAME
+    manifest_path = Path(public_dir) / MANIFEST_NAME
+    url_prefix = f"/data/{ASSET_DIR_NAME}"
+
+    previous = {}
+    if manifest_path.exists():
+        with open(manifest_path) as f:
+            previous = json.load(f).get("assets", {})
+
+    assets = {}
+    stats = {"published": 0, "skipped": 0, "pruned": 0}
+
+    tile_sets, stats["tile_sets_published"], stats["tile_sets_skipped"] = publish_tiles(
+        data_dir, public_dir, previous)
+
+    for logical_name in find_outputs(data_dir):
+        source = Path(data_dir) / logical_name
+        digest = content_hash(source)
+        target_name = hashed_name(logical_name, digest)
+        target = asset_dir / target_name
+
+        if target.exists() and previous.get(logical_name, {}).get("hash") == digest:
+            assets[logical_name] = previous[logical_name]
+            stats["skipped"] += 1
+            continue
+
+        os.makedirs(target.parent, exist_ok=True)
+        shutil.copyfile(source, target)
+        encodings = []
+        if source.suffix.lower() in COMPRESSIBLE_EXTENSIONS:
+            encodings = write_compressed(target)
+
+        assets[logical_name] = {
+            "url": f"{url_prefix}/{target_name}",
+            "hash": digest,
+            "size": source.stat().st_size,
+            "encodings": encodings
+        }
+        stats["published"] += 1
+
+    if prune:
+        referenced = set()
+        for asset in assets.values():
+            path = asset_dir / asset["url"][len(url_prefix) + 1:]
+            referenced.update({path, Path(f"{path}.gz"), Path(f"{path}.br")})
+        for path in asset_dir.rglob("*"):
+            if path.is_file() and path not in referenced:
+                path.unlink()
+                stats["pruned"] += 1
+
+        # Older versions of the tile sets, and sets that no longer exist
+        tile_dir = Path(public_dir) / TILE_DIR_NAME
+        current = {Path(public_dir) / name / Path(entry["url"]).name for name, entry in tile_sets.items()}
+        for path in tile_dir.glob("*/*/*"):
+            if path in current:
+                continue
+            if path.is_dir():
+                shutil.rmtree(path)
+            else:
+                path.unlink()
+            stats["pruned"] += 1
+
+    assets.update(tile_sets)
+    manifest = {"version": 1, "assets": assets}
+    tmp_path = manifest_path.with_suffix(".json.tmp")
+    os.makedirs(manifest_path.parent, exist_ok=True)
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=4, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+    return manifest, stats
+
+def main():
+    parser = argparse.ArgumentParser(description="Publish analysis outputs with content-hashed names")
+    parser.add_argument("--data-dir", default=str(DATA_DIR), help="Analysis output directory")
+    parser.add_argument("--public-dir", default=str(PUBLIC_DATA_DIR), help="Next.js public data directory")
+    parser.add_argument("--prune", action="store_true",
+                        help="Delete published assets that are no longer in the manifest")
+    args = parser.parse_args()
+
+    if brotli is None:
+        print("brotli is not installed, only gzip variants will be written")
+
+    manifest, stats = publish(args.data_dir, args.public_dir, prune=args.prune)
+
+    print(f"Published {stats['published']} assets and {stats['tile_sets_published']} tile sets, "
+          f"skipped {stats['skipped']} assets and {stats['tile_sets_skipped']} tile sets unchanged"
+          + (f", pruned {stats['pruned']} stale files and tile versions" if args.prune else ""))
+    print(f"Manifest: {Path(args.public_dir) / MANIFEST_NAME}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Rendering layer that owns the lifecycle of every matplotlib figure.
+
+Figures are created with the object-oriented API and an Agg canvas, so they are
+never registered on pyplot's global figure stack and cannot leak there. One
+figure with its axes is preallocated per image kind and reused for every file:
+leaving the figure() context clears the axes and removes extra axes such as
+colorbars, whether the render succeeded or raised. A batch therefore holds a
+fixed set of figures no matter how many files it renders.
+"""
+import os
+import threading
+from contextlib import contextmanager
+
+_local = threading.local()
+
+def peak_rss():
+    """Peak resident set size of this process in bytes (None where unsupported)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def current_rss():
+    """Current resident set size of this process in bytes (peak RSS where unsupported)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return peak_rss()
+
+class Renderer:
+    """
+    Cache of reusable figures keyed by image kind.
+    Not thread-safe: use get_renderer() for a per-thread instance.
+    """
+
+    def __init__(self):
+        self._figures = {}
+        self.figures_created = 0
+        self.renders = 0
+        self.failures = 0
+
+    def _create(self, figsize, nrows):
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+        fig = Figure(figsize=figsize)
+        FigureCanvasAgg(fig)
+        axes = [fig.add_subplot(nrows, 1, i + 1) for i in range(nrows)]
+        # Colorbars re-grid their parent axes and tight_layout moves the subplot
+        # parameters, so remember both to start every render from the same layout
+        subplotpars = {name: getattr(fig.subplotpars, name)
+                       for name in ("left", "right", "bottom", "top", "wspace", "hspace")}
+        layout = (subplotpars, [(ax.get_subplotspec(), ax.get_position()) for ax in axes])
+        self.figures_created += 1
+        return fig, axes, layout
+
+    @contextmanager
+    def figure(self, kind, figsize, nrows=1):
+        """
+        Yield (fig, axes) for an image kind, reusing the figure from the last
+        render of that kind. The figure is always reset on exit.
+        """
+        key = (kind, tuple(figsize), nrows)
+        if key not in self._figures:
+            self._figures[key] = self._create(figsize, nrows)
+        fig, axes, _ = self._figures[key]
+
+        self.renders += 1
+        try:
+            yield fig, axes
+        except Exception:
+            self.failures += 1
+            raise
+        finally:
+            self._reset(key)
+
+    def _reset(self, key):
+        fig, axes, layout = self._figures[key]
+        try:
+            # Colorbars and other axes added during the render are dropped
+            for ax in list(fig.axes):
+                if ax not in axes:
+                    ax.remove()
+            subplotpars, positions = layout
+            fig.subplots_adjust(**subplotpars)
+            for ax, (subplotspec, position) in zip(axes, positions):
+                ax.clear()
+                ax.set_subplotspec(subplotspec)
+                ax.set_position(position)
+            fig.texts.clear()
+        except Exception:
+            # A figure that cannot be reset is discarded and rebuilt next time
+            fig.clear()
+            del self._figures[key]
+
+    def close(self):
+        """Release every cached figure."""
+        for fig, _, _ in self._figures.values():
+            fig.clear()
+        self._figures.clear()
+
+    def memory_stats(self):
+        return {
+            "peak_rss": peak_rss(),
+            "cached_figures": len(self._figures),
+            "figures_created": self.figures_created,
+            "renders": self.renders,
+            "failures": self.failures
+        }
+
+def get_renderer():
+    """Renderer for the calling thread."""
+    if not hasattr(_local, "renderer"):
+        _local.renderer = Renderer()
+    return _local.renderer
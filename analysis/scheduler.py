@@ -0,0 +1,269 @@
+"""
+Memory-aware scheduler for batch analysis runs.
+
+Every job's duration is read from file metadata before anything is decoded,
+and turned into an estimate of its cost (seconds of audio to process) and its
+peak memory. Jobs are started longest-first so a giant file never ends up
+running alone at the end of the batch, and a job is only started while the
+sum of the estimated peaks of the running jobs stays inside the memory budget.
+Smaller jobs fill the remaining room when the next large job does not fit yet,
+but a waiting job can only be overtaken MAX_PASSED_OVER times: after that no
+new job starts until enough memory is freed for it, so a steady stream of
+small jobs cannot starve it.
+
+The memory model is deliberately simple: the decoded mono float32 signal plus
+the STFT/mel/onset intermediates librosa builds from it scale with the number
+of samples, and rendering the waveform plots adds roughly as much again. The
+per-sample factors below are rough upper bounds for analyze_element and can
+be tuned if the reported estimates turn out too loose or too tight.
+
+On top of its jobs every worker process stays resident with the imported
+librosa/numba/matplotlib stack, often several hundred MB once the first file
+has been analyzed. That baseline is measured at startup by analyzing a short
+generated clip in a probe process, and charged against the budget for every
+worker of the pool; the pool is shrunk when the budget cannot hold that many
+workers. The report prints the estimates next to the measured high-water marks.
+"""
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from pathlib import Path
+
+from pipeline import AUDIO_EXTENSIONS, element_name
+
+# Peak bytes per decoded sample while extracting features, and extra when rendering images
+ANALYSIS_BYTES_PER_SAMPLE = 48
+RENDER_BYTES_PER_SAMPLE = 40
+# Fixed overhead of a job on top of the worker's imported modules
+JOB_OVERHEAD_BYTES = 32 * 1024 * 1024
+# Resident size of a worker with the analysis stack imported, if it cannot be measured
+DEFAULT_WORKER_BASELINE_BYTES = 400 * 1024 * 1024
+# Times a job that does not fit can be overtaken by smaller ones before the queue waits for it
+MAX_PASSED_OVER = 2
+# Fallbacks when the audio header cannot be read without decoding
+DEFAULT_SAMPLE_RATE = 44100
+DEFAULT_MP3_BITRATE = 192000
+
+def probe_duration(path):
+    """
+    Return (duration, sample_rate) from the file header, without decoding.
+    Falls back to a bitrate estimate from the file size.
+    """
+    try:
+        import soundfile as sf
+        info = sf.info(path)
+        return info.duration, info.samplerate
+    except Exception:
+        size_bits = os.path.getsize(path) * 8
+        return size_bits / DEFAULT_MP3_BITRATE, DEFAULT_SAMPLE_RATE
+
+def estimate_job(path, render=True):
+    """
+    Estimate cost and peak memory of analyzing one file.
+    """
+    path = str(path)
+    if Path(path).suffix.lower() not in AUDIO_EXTENSIONS:
+        # MIDI analysis works on note lists: cheap and small
+        size = os.path.getsize(path)
+        return {
+            "path": path,
+            "duration": 0.0,
+            "cost": size / 1e6,
+            "memory": JOB_OVERHEAD_BYTES + 100 * size
+        }
+
+    duration, sr = probe_duration(path)
+    samples = duration * sr
+    bytes_per_sample = ANALYSIS_BYTES_PER_SAMPLE + (RENDER_BYTES_PER_SAMPLE if render else 0)
+    return {
+        "path": path,
+        "duration": float(duration),
+        "cost": float(duration),
+        "memory": int(JOB_OVERHEAD_BYTES + samples * bytes_per_sample)
+    }
+
+def measure_worker_baseline(render, image_settings=None, seconds=2, sr=22050):
+    """
+    Resident size of a worker after analyzing a short noise clip (runs in a
+    probe process). Lazy imports and numba compilation only happen on the
+    first analysis, so an idle worker would understate the baseline.
+    """
+    import random
+    import tempfile
+    import wave
+    from render import current_rss
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "baseline.wav")
+        with wave.open(path, "wb") as f:
+            f.setnchannels(1)
+            f.setsampwidth(2)
+            f.setframerate(sr)
+            f.writeframes(b"".join(random.randint(-8000, 8000).to_bytes(2, "little", signed=True)
+                                   for _ in range(seconds * sr)))
+        run_job(path, tmp_dir if render else None, image_settings)
+    return current_rss()
+
+def run_job(path, image_dir, image_settings=None):
+    """Analyze and classify one file (runs in a worker process)."""
+    from analyze_elements import analyze_element, classify_element
+    from image_writer import configure_image_writer, get_image_writer
+    from render import peak_rss
+
+    start_time = time.time()
+    writer = get_image_writer()
+    if image_settings and writer.settings() != image_settings:
+        writer = configure_image_writer(**image_settings)
+
+    analysis = analyze_element(path, image_dir)
+    analysis["element_type"] = classify_element(element_name(path), analysis)
+    # The images must be on disk before the parent records the result
+    writer.flush()
+    return analysis, time.time() - start_time, peak_rss(), os.getpid()
+
+def run_scheduled(file_paths, image_dir=None, workers=None, memory_budget=2 * 1024 ** 3, image_settings=None):
+    """
+    Analyze files on a process pool, longest job first, keeping the estimated
+    memory of the worker processes and their running jobs within
+    memory_budget bytes. image_settings configures the image writer of every
+    worker (see image_writer.py).
+
+    Returns (element_analysis, visualization_data, report).
+    """
+    from analyze_elements import build_visualization_element
+
+    requested_workers = workers or os.cpu_count() or 1
+    image_dir = str(image_dir) if image_dir else None
+    jobs = [estimate_job(p, render=image_dir is not None) for p in file_paths]
+    pending = sorted(jobs, key=lambda job: job["cost"], reverse=True)
+
+    with ProcessPoolExecutor(max_workers=1) as probe:
+        try:
+            baseline = probe.submit(measure_worker_baseline, image_dir is not None, image_settings).result()
+        except Exception as e:
+            print(f"Warning: could not measure the worker baseline ({e}), assuming "
+                  f"{DEFAULT_WORKER_BASELINE_BYTES / 1024 ** 2:.0f} MB")
+            baseline = DEFAULT_WORKER_BASELINE_BYTES
+
+    # Every worker of the pool stays resident, each needing room for at least the smallest job
+    smallest_job = min((job["memory"] for job in jobs), default=0)
+    workers = max(1, min(requested_workers, len(jobs) or 1,
+                         int(memory_budget // (baseline + smallest_job))))
+    if workers < min(requested_workers, len(jobs)):
+        print(f"Using {workers} of {requested_workers} workers: each keeps about "
+              f"{baseline / 1024 ** 2:.0f} MB resident, over the memory budget otherwise")
+    baseline_memory = workers * baseline
+
+    element_analysis = {}
+    visualization_data = {}
+    running = {}
+    reserved = baseline_memory
+    peak_reserved = reserved
+    reserved_time = 0.0
+    busy_time = 0.0
+    oversized = 0
+    head_of_line_waits = 0
+    worker_rss = {}
+
+    start_time = time.time()
+
+    last_change = start_time
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        while pending or running:
+            # Admit the largest jobs that fit in the remaining budget
+            passed_over = []
+            for job in list(pending):
+                if len(running) >= workers:
+                    break
+                fits = reserved + job["memory"] <= memory_budget
+                if not fits and running:
+                    if job.get("passed_over", 0) >= MAX_PASSED_OVER:
+                        # Keep the freed memory for this job instead of starting smaller ones
+                        head_of_line_waits += 1
+                        break
+                    passed_over.append(job)
+                    continue
+                if not fits:
+                    # Too big for the budget on its own: run it alone
+                    oversized += 1
+                    print(f"Warning: {job['path']} needs an estimated "
+                          f"{(baseline + job['memory']) / 1024 ** 2:.0f} MB including the worker, over the budget")
+
+                now = time.time()
+                reserved_time += reserved * (now - last_change)
+                last_change = now
+
+                for waiting in passed_over:
+                    waiting["passed_over"] = waiting.get("passed_over", 0) + 1
+
+                pending.remove(job)
+                future = executor.submit(run_job, job["path"], image_dir, image_settings)
+                running[future] = job
+                reserved += job["memory"]
+                peak_reserved = max(peak_reserved, reserved)
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+
+            now = time.time()
+            reserved_time += reserved * (now - last_change)
+            last_change = now
+
+            for future in done:
+                job = running.pop(future)
+                reserved -= job["memory"]
+                name = element_name(job["path"])
+                try:
+                    analysis, elapsed, rss, pid = future.result()
+                    worker_rss[pid] = max(worker_rss.get(pid, 0), rss or 0)
+                except Exception as e:
+                    analysis, elapsed = {"error": str(e), "type": "unknown", "element_type": "unknown"}, 0.0
+                busy_time += elapsed
+                job["elapsed"] = elapsed
+
+                element_analysis[name] = analysis
+                visualization_data[name] = build_visualization_element(name, analysis)
+
+    wall_time = time.time() - start_time
+    report = {
+        "jobs": len(jobs),
+        "workers": workers,
+        "requested_workers": requested_workers,
+        "wall_time": wall_time,
+        "busy_time": busy_time,
+        "worker_utilization": busy_time / (workers * wall_time) if wall_time > 0 else 0.0,
+        "memory_budget": memory_budget,
+        "worker_baseline": baseline,
+        "peak_reserved_memory": peak_reserved,
+        "mean_reserved_memory": reserved_time / wall_time if wall_time > 0 else 0.0,
+        "largest_job_memory": max((job["memory"] for job in jobs), default=0),
+        "oversized_jobs": oversized,
+        "head_of_line_waits": head_of_line_waits,
+        "peak_worker_rss": max(worker_rss.values(), default=0),
+        "total_worker_rss": sum(worker_rss.values()),
+        "audio_seconds": sum(job["duration"] for job in jobs)
+    }
+    return element_analysis, visualization_data, report
+
+def print_report(report):
+    mb = 1024 ** 2
+    print(f"Scheduled {report['jobs']} jobs on {report['workers']} workers "
+          f"({report['audio_seconds']:.0f}s of audio) in {report['wall_time']:.1f}s")
+    print(f"- Worker utilization: {report['worker_utilization'] * 100:.0f}%")
+    print(f"- Memory budget {report['memory_budget'] / mb:.0f} MB, "
+          f"measured worker baseline {report['worker_baseline'] / mb:.0f} MB")
+    print(f"  {'':<12}{'estimated':>12}{'measured':>12}")
+    estimated_worker = report["worker_baseline"] + report["largest_job_memory"]
+    print(f"  {'per worker':<12}{estimated_worker / mb:>9.0f} MB"
+          f"{report['peak_worker_rss'] / mb:>9.0f} MB")
+    print(f"  {'all workers':<12}{report['peak_reserved_memory'] / mb:>9.0f} MB"
+          f"{report['total_worker_rss'] / mb:>9.0f} MB")
+    print(f"  (mean estimated {report['mean_reserved_memory'] / mb:.0f} MB; "
+          f"measured values are per-process RSS high-water marks)")
+    if report["peak_worker_rss"] > estimated_worker:
+        print("- Warning: workers used more memory than estimated, the budget is not a safe limit; "
+              "use fewer --jobs or raise the per-sample factors in scheduler.py")
+    if report["oversized_jobs"]:
+        print(f"- {report['oversized_jobs']} jobs exceeded the budget and ran alone")
+    if report["head_of_line_waits"]:
+        print(f"- Held back smaller jobs {report['head_of_line_waits']} times to let a large job start")
@@ -0,0 +1,290 @@
+"""
+Multi-resolution spectrogram tiles for zoomable views.
+
+The STFT or mel spectrogram of a file is computed once, in chunks, and stored
+as a pyramid of dB matrices (float16 .npy files, memory-mapped on read):
+level max_zoom holds one STFT frame per pixel horizontally and every level
+below halves the time axis until the whole duration fits in one tile column.
+The frequency axis keeps one bin per pixel on every level, so zooming out of
+a long mix loses time detail only and every level has the same tile rows.
+Tiles are TILE_SIZE x TILE_SIZE PNGs
+addressed like map tiles, {zoom}/{x}/{y}.png, with x counting along time and
+y counting up from the lowest frequency. They are rendered from the cached
+levels on first request and kept on disk afterwards.
+
+Layout under ../data/tiles/{name}/{kind}/:
+    manifest.json      levels, tile grid, time/frequency scale and dB range
+    levels/{zoom}.npy  cached dB matrix of each level
+    {zoom}/{x}/{y}.png rendered tiles
+
+A rebuild writes the new pyramid into a hidden sibling directory and swaps
+it in under the tile set's lock, which get_tile holds while it reads levels
+and writes tiles, so requests served during a rebuild see either the old or
+the new pyramid, never a mix or a half-deleted one.
+"""
+import argparse
+import json
+import os
+import shutil
+import threading
+import uuid
+from pathlib import Path
+
+import numpy as np
+
+TILE_SIZE = 256
+N_FFT = 2048
+HOP_LENGTH = 512
+N_MELS = 128
+TOP_DB = 80.0
+# Frames computed per STFT chunk, bounds memory for hour-long mixes
+CHUNK_FRAMES = 4096
+
+TILE_ROOT = Path("../data/tiles")
+
+KINDS = {
+    "spectrogram": {"cmap": "magma", "scale": "linear"},
+    "mel_spectrogram": {"cmap": "viridis", "scale": "mel"}
+}
+
+_set_locks = {}
+_set_locks_lock = threading.Lock()
+
+def tile_dir(name, kind, tile_root=TILE_ROOT):
+    return Path(tile_root) / name / kind
+
+def tile_set_lock(name, kind, tile_root=TILE_ROOT):
+    """Lock guarding a tile set's directory against a concurrent swap."""
+    key = os.path.abspath(tile_dir(name, kind, tile_root))
+    with _set_locks_lock:
+        return _set_locks.setdefault(key, threading.RLock())
+
+def compute_base_level(y, sr, kind, path):
+    """
+    Compute the full-resolution dB matrix (bins x frames) chunk by chunk into
+    a float16 .npy file and return its maximum.
+    """
+    import librosa
+
+    # Reflect-pad like librosa.stft(center=True) so frame boundaries match
+    y_padded = np.pad(y, N_FFT // 2, mode="reflect")
+    n_frames = 1 + len(y) // HOP_LENGTH
+    mel_basis = librosa.filters.mel(sr=sr, n_fft=N_FFT, n_mels=N_MELS) if kind == "mel_spectrogram" else None
+    n_bins = N_MELS if mel_basis is not None else 1 + N_FFT // 2
+
+    levels = np.lib.format.open_memmap(path, mode="w+", dtype=np.float16, shape=(n_bins, n_frames))
+    max_db = -np.inf
+
+    for start in range(0, n_frames, CHUNK_FRAMES):
+        end = min(start + CHUNK_FRAMES, n_frames)
+        segment = y_padded[start * HOP_LENGTH:(end - 1) * HOP_LENGTH + N_FFT]
+        power = np.abs(librosa.stft(segment, n_fft=N_FFT, hop_length=HOP_LENGTH, center=False)) ** 2
+
+        if mel_basis is not None:
+            power = mel_basis @ power
+        chunk_db = librosa.power_to_db(power, ref=1.0, top_db=None)
+
+        levels[:, start:end] = chunk_db[:, :end - start]
+        max_db = max(max_db, float(np.max(chunk_db)))
+
+    levels.flush()
+    return max_db
+
+def downsample_level(src_path, dst_path):
+    """Halve the time axis of a level by averaging frame pairs, in time chunks."""
+    src = np.load(src_path, mmap_mode="r")
+    height, width = src.shape
+    out_width = (width + 1) // 2
+    dst = np.lib.format.open_memmap(dst_path, mode="w+", dtype=np.float16, shape=(height, out_width))
+
+    for start in range(0, width, 2 * CHUNK_FRAMES):
+        block = np.asarray(src[:, start:start + 2 * CHUNK_FRAMES], dtype=np.float32)
+        # Repeat the last column so odd widths pool cleanly
+        if block.shape[1] % 2:
+            block = np.hstack([block, block[:, -1:]])
+        pooled = block.reshape(height, block.shape[1] // 2, 2).mean(axis=2)
+        dst[:, start // 2:start // 2 + pooled.shape[1]] = pooled
+
+    dst.flush()
+    return height, out_width
+
+def build_pyramid(audio_file, kind, tile_root=TILE_ROOT, audio=None):
+    """
+    Compute the spectrogram once, cache every pyramid level and write the manifest.
+    Returns the manifest. Tiles themselves are rendered lazily by get_tile.
+    """
+    if kind not in KINDS:
+        raise ValueError(f"Unknown spectrogram kind: {kind}")
+
+    import librosa
+
+    name = Path(audio_file).stem
+    y, sr = audio if audio is not None else librosa.load(audio_file, sr=None)
+
+    # Build from scratch next to the live set, so tiles of an older version are dropped
+    directory = tile_dir(name, kind, tile_root)
+    build_dir = directory.with_name(f".{kind}.{uuid.uuid4().hex}")
+    try:
+        manifest = _build_levels(y, sr, name, kind, build_dir)
+    except BaseException:
+        shutil.rmtree(build_dir, ignore_errors=True)
+        raise
+
+    # Directories cannot be replaced atomically: move the old set aside under the lock
+    old_dir = directory.with_name(f".{kind}.old.{uuid.uuid4().hex}")
+    with tile_set_lock(name, kind, tile_root):
+        if directory.exists():
+            os.replace(directory, old_dir)
+        os.replace(build_dir, directory)
+    shutil.rmtree(old_dir, ignore_errors=True)
+
+    return manifest
+
+def _build_levels(y, sr, name, kind, directory):
+    """Write the levels and manifest of a pyramid into directory. Returns the manifest."""
+    level_dir = directory / "levels"
+    os.makedirs(level_dir, exist_ok=True)
+
+    # Compute the full resolution first, then halve the time axis until one tile column covers it
+    shapes = []
+    level_path = level_dir / "base.npy"
+    max_db = compute_base_level(y, sr, kind, level_path)
+    shapes.append(np.load(level_path, mmap_mode="r").shape)
+    level_paths = [level_path]
+
+    while shapes[-1][1] > TILE_SIZE:
+        next_path = level_dir / f"tmp_{len(level_paths)}.npy"
+        shapes.append(downsample_level(level_paths[-1], next_path))
+        level_paths.append(next_path)
+
+    # Number levels from the coarsest (0) to full resolution (max_zoom)
+    max_zoom = len(level_paths) - 1
+    levels = []
+    for index, (path, (height, width)) in enumerate(zip(level_paths, shapes)):
+        zoom = max_zoom - index
+        os.replace(path, level_dir / f"{zoom}.npy")
+        scale = 2 ** index
+        levels.append({
+            "zoom": zoom,
+            "width": width,
+            "height": height,
+            "columns": -(-width // TILE_SIZE),
+            "rows": -(-height // TILE_SIZE),
+            "seconds_per_pixel": scale * HOP_LENGTH / sr,
+            "bins_per_pixel": 1
+        })
+
+    manifest = {
+        "name": name,
+        "kind": kind,
+        "tile_size": TILE_SIZE,
+        "max_zoom": max_zoom,
+        "duration": float(len(y) / sr),
+        "sample_rate": sr,
+        "n_fft": N_FFT,
+        "hop_length": HOP_LENGTH,
+        "frequency_scale": KINDS[kind]["scale"],
+        "fmax": sr / 2,
+        "db_max": max_db,
+        "db_min": max_db - TOP_DB,
+        "cmap": KINDS[kind]["cmap"],
+        "levels": sorted(levels, key=lambda level: level["zoom"])
+    }
+
+    with open(directory / "manifest.json", "w") as f:
+        json.dump(manifest, f, indent=4)
+
+    return manifest
+
+def load_manifest(name, kind, tile_root=TILE_ROOT):
+    path = tile_dir(name, kind, tile_root) / "manifest.json"
+    with tile_set_lock(name, kind, tile_root):
+        if not path.exists():
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+def render_tile(manifest, level_path, x, y, output_path):
+    """Colour-map one tile of a cached level and write it as a PNG."""
+    import matplotlib
+    from matplotlib.image import imsave
+
+    level = np.load(level_path, mmap_mode="r")
+    data = np.asarray(level[y * TILE_SIZE:(y + 1) * TILE_SIZE, x * TILE_SIZE:(x + 1) * TILE_SIZE],
+                      dtype=np.float32)
+    height, width = data.shape
+
+    # Rows are in bin order (lowest frequency first), padded to a full tile
+    tile = np.full((TILE_SIZE, TILE_SIZE), manifest["db_min"], dtype=np.float32)
+    tile[:height, :width] = data
+
+    normalized = np.clip((tile - manifest["db_min"]) / (manifest["db_max"] - manifest["db_min"]), 0, 1)
+    rgba = matplotlib.colormaps[manifest["cmap"]](normalized, bytes=True)
+
+    # Fully transparent where the tile extends past the data
+    rgba[height:, :, 3] = 0
+    rgba[:, width:, 3] = 0
+
+    # Image rows run top-down, so flip to put low frequencies at the bottom
+    os.makedirs(output_path.parent, exist_ok=True)
+    tmp_path = output_path.with_name(f"{output_path.name}.tmp")
+    imsave(tmp_path, rgba[::-1], format="png")
+    os.replace(tmp_path, output_path)
+
+def get_tile(name, kind, zoom, x, y, tile_root=TILE_ROOT):
+    """
+    Return the path of a tile, rendering it on first request.
+    Returns None for coordinates outside the pyramid or if no manifest exists.
+    """
+    # Held across reading the manifest, the level and writing the tile, so a rebuild cannot swap them mid-way
+    with tile_set_lock(name, kind, tile_root):
+        manifest = load_manifest(name, kind, tile_root)
+        if manifest is None or not 0 <= zoom <= manifest["max_zoom"]:
+            return None
+
+        level = manifest["levels"][zoom]
+        if not (0 <= x < level["columns"] and 0 <= y < level["rows"]):
+            return None
+
+        directory = tile_dir(name, kind, tile_root)
+        output_path = directory / str(zoom) / str(x) / f"{y}.png"
+        if not output_path.exists():
+            render_tile(manifest, directory / "levels" / f"{zoom}.npy", x, y, output_path)
+        return output_path
+
+def read_tile(name, kind, zoom, x, y, tile_root=TILE_ROOT):
+    """
+    Return the PNG bytes of a tile, rendering it on first request. Unlike
+    get_tile's path, the bytes stay valid when the pyramid is rebuilt.
+    """
+    with tile_set_lock(name, kind, tile_root):
+        path = get_tile(name, kind, zoom, x, y, tile_root)
+        if path is None:
+            return None
+        with open(path, "rb") as f:
+            return f.read()
+
+def main():
+    parser = argparse.ArgumentParser(description="Build zoomable spectrogram tile pyramids")
+    parser.add_argument("files", nargs="+", help="Audio files")
+    parser.add_argument("--kind", choices=list(KINDS), action="append",
+                        help="Spectrogram kind (default: both)")
+    parser.add_argument("--all-tiles", action="store_true",
+                        help="Render every tile now instead of on first request (for static hosting)")
+    args = parser.parse_args()
+
+    for audio_file in args.files:
+        for kind in args.kind or list(KINDS):
+            print(f"Building {kind} pyramid for {audio_file}...")
+            manifest = build_pyramid(audio_file, kind)
+
+            if args.all_tiles:
+                for level in manifest["levels"]:
+                    for x in range(level["columns"]):
+                        for y in range(level["rows"]):
+                            get_tile(manifest["name"], kind, level["zoom"], x, y)
+
+    print(f"Tile pyramids saved to {TILE_ROOT}/")
+
+if __name__ == "__main__":
+    main()
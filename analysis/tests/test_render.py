@@ -0,0 +1,50 @@
+import warnings
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("matplotlib")
+
+from render import Renderer
+
+RENDERS = 40
+
+def draw_envelope(renderer):
+    """A two-row plot with a colorbar and tight_layout, like the bass envelope."""
+    t = np.linspace(0, 1, 200)
+    with renderer.figure("envelope", (10, 4), nrows=2) as (fig, (top, bottom)):
+        top.plot(t, np.sin(8 * np.pi * t))
+        top.set_title("Waveform")
+        img = bottom.imshow(np.outer(np.linspace(0, 1, 16), t), aspect="auto")
+        fig.colorbar(img, ax=bottom)
+        bottom.set_title("Amplitude Envelope")
+        bottom.set_xlabel("Time (s)")
+        fig.tight_layout()
+
+        fig.canvas.draw()
+        return np.array(fig.canvas.buffer_rgba())
+
+def test_reused_figure_renders_identically():
+    renderer = Renderer()
+    with warnings.catch_warnings():
+        # "Tight layout not applied" is the symptom of a drifting layout
+        warnings.simplefilter("error")
+        frames = [draw_envelope(renderer) for _ in range(RENDERS)]
+
+    assert renderer.figures_created == 1
+    for frame in frames[1:]:
+        assert np.array_equal(frame, frames[0])
+
+def test_failed_render_does_not_affect_the_next():
+    renderer = Renderer()
+    first = draw_envelope(renderer)
+
+    with pytest.raises(RuntimeError):
+        with renderer.figure("envelope", (10, 4), nrows=2) as (fig, (top, bottom)):
+            top.plot([0, 1], [1, 0])
+            fig.colorbar(bottom.imshow(np.ones((2, 2))), ax=bottom)
+            fig.subplots_adjust(left=0.4, hspace=0.9)
+            raise RuntimeError("render failed")
+
+    assert np.array_equal(draw_envelope(renderer), first)
+    assert renderer.failures == 1
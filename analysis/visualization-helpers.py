@@ -1,10 +1,15 @@
-import matplotlib.pyplot as plt
 import numpy as np
 import json
 import os
 from pathlib import Path
-import librosa
-import librosa.display
+
+# librosa and matplotlib are imported inside the generators that use them,
+# so importing this module (e.g. for NumpyEncoder) stays cheap. Figures come
+# from the reusable, leak-free figure cache in render.py and are encoded in
+# the background by image_writer.py
+from analyze_elements import pitch_contour_from_piptrack
+from render import get_renderer
+from image_writer import get_image_writer
 
 # Custom JSON encoder to handle NumPy types
 class NumpyEncoder(json.JSONEncoder):
@@ -17,13 +22,21 @@ class NumpyEncoder(json.JSONEncoder):
             return obj.tolist()
         return super(NumpyEncoder, self).default(obj)
 
-def generate_break_visualization(audio_file, output_dir):
+def generate_break_visualization(audio_file, output_dir, audio=None, sr=None, n_mels=128):
     """
     Generate specialized visualizations for break samples
+    (audio can be an already decoded (y, sr) pair, sr resamples on load and
+    n_mels sets the mel bands of the onset envelope and mel spectrogram)
     """
     try:
+        import librosa
+        import librosa.display
+        renderer = get_renderer()
+        writer = get_image_writer()
+        images = {}
+        
         # Load the audio file
-        y, sr = librosa.load(audio_file, sr=None)
+        y, sr = audio if audio is not None else librosa.load(audio_file, sr=sr)
         
         # Create output directory
         os.makedirs(output_dir, exist_ok=True)
@@ -32,38 +45,33 @@ def generate_break_visualization(audio_file, output_dir):
         file_name = os.path.basename(audio_file).split('.')[0]
         
         # 1. Create enhanced waveform with onset markers
-        plt.figure(figsize=(10, 4))
-        
-        # Plot waveform
-        plt.subplot(2, 1, 1)
-        librosa.display.waveshow(y, sr=sr)
-        plt.title(f"Waveform with Onsets: {file_name}")
-        
-        # Calculate onsets and mark them
-        onset_env = librosa.onset.onset_strength(y=y, sr=sr)
-        onset_frames = librosa.onset.onset_detect(onset_envelope=onset_env, sr=sr)
-        onset_times = librosa.frames_to_time(onset_frames, sr=sr)
-        
-        # Plot onset markers
-        for onset_time in onset_times:
-            plt.axvline(x=onset_time, color='r', alpha=0.7, linestyle='--')
-        
-        # 2. Create onset strength plot (useful for visualizing rhythm)
-        plt.subplot(2, 1, 2)
-        frames = range(len(onset_env))
-        t = librosa.frames_to_time(frames, sr=sr)
-        plt.plot(t, onset_env)
-        plt.title("Onset Strength")
-        plt.xlabel("Time (s)")
-        plt.tight_layout()
-        
-        # Save combined plot
-        plt.savefig(f"{output_dir}/{file_name}_break_analysis.png", dpi=150)
-        plt.close()
+        with renderer.figure("break_analysis", (10, 4), nrows=2) as (fig, (wave_ax, onset_ax)):
+            # Plot waveform
+            librosa.display.waveshow(y, sr=sr, ax=wave_ax)
+            wave_ax.set_title(f"Waveform with Onsets: {file_name}")
+            
+            # Calculate onsets and mark them
+            onset_env = librosa.onset.onset_strength(y=y, sr=sr, n_mels=n_mels)
+            onset_frames = librosa.onset.onset_detect(onset_envelope=onset_env, sr=sr)
+            onset_times = librosa.frames_to_time(onset_frames, sr=sr)
+            
+            # Plot onset markers
+            for onset_time in onset_times:
+                wave_ax.axvline(x=onset_time, color='r', alpha=0.7, linestyle='--')
+            
+            # 2. Create onset strength plot (useful for visualizing rhythm)
+            frames = range(len(onset_env))
+            t = librosa.frames_to_time(frames, sr=sr)
+            onset_ax.plot(t, onset_env)
+            onset_ax.set_title("Onset Strength")
+            onset_ax.set_xlabel("Time (s)")
+            fig.tight_layout()
+            
+            # Save combined plot
+            images["break_analysis"] = writer.save(fig, output_dir, f"{file_name}_break_analysis", dpi=150)
         
         # 3. Create rhythmic pattern visualization
         # Create a time grid visualization based on onset strength
-        plt.figure(figsize=(12, 3))
         
         # Divide into 16 or 32 segments (common for break patterns)
         segments = 16
@@ -97,45 +105,45 @@ def generate_break_visualization(audio_file, output_dir):
             segment_strengths = [float(s / max(segment_strengths)) for s in segment_strengths]
         
         # Create grid visualization
-        for i, strength in enumerate(segment_strengths):
-            # Color based on strength (white to red)
-            color = (1, 1-strength, 1-strength)  # RGB: white to red
-            plt.axvspan(i, i+0.9, alpha=0.8, color=color)
+        with renderer.figure("rhythm_grid", (12, 3)) as (fig, (ax,)):
+            for i, strength in enumerate(segment_strengths):
+                # Color based on strength (white to red)
+                color = (1, 1-strength, 1-strength)  # RGB: white to red
+                ax.axvspan(i, i+0.9, alpha=0.8, color=color)
+                
+                # Add text labels for stronger beats
+                if strength > 0.5:
+                    ax.text(i+0.45, 0.5, f"{i+1}", ha='center', va='center', 
+                            fontsize=12, fontweight='bold', color='black')
+            
+            ax.set_ylim(0, 1)
+            ax.set_xlim(0, segments)
+            ax.set_title(f"Rhythmic Pattern: {file_name}")
+            ax.set_xticks(np.arange(0.5, segments, 1))
+            ax.set_xticklabels([f"{i+1}" for i in range(segments)])
+            ax.set_yticks([])
+            ax.grid(False)
+            fig.tight_layout()
             
-            # Add text labels for stronger beats
-            if strength > 0.5:
-                plt.text(i+0.45, 0.5, f"{i+1}", ha='center', va='center', 
-                         fontsize=12, fontweight='bold', color='black')
-        
-        plt.ylim(0, 1)
-        plt.xlim(0, segments)
-        plt.title(f"Rhythmic Pattern: {file_name}")
-        plt.xticks(np.arange(0.5, segments, 1), [f"{i+1}" for i in range(segments)])
-        plt.yticks([])
-        plt.grid(False)
-        plt.tight_layout()
-        
-        plt.savefig(f"{output_dir}/{file_name}_rhythm_grid.png", dpi=150)
-        plt.close()
+            images["rhythm_grid"] = writer.save(fig, output_dir, f"{file_name}_rhythm_grid", dpi=150, flat=True)
         
         # 4. Create mel spectrogram for texture visualization
-        plt.figure(figsize=(10, 6))
-        mel_spec = librosa.feature.melspectrogram(y=y, sr=sr, n_mels=128)
-        mel_spec_db = librosa.power_to_db(mel_spec, ref=np.max)
-        
-        img = librosa.display.specshow(mel_spec_db, sr=sr, x_axis='time', y_axis='mel', 
-                                     cmap='viridis')
-        plt.colorbar(img, format="%+2.f dB")
-        plt.title(f"Mel Spectrogram: {file_name}")
-        plt.tight_layout()
-        
-        plt.savefig(f"{output_dir}/{file_name}_mel_spectrogram.png", dpi=150)
-        plt.close()
+        with renderer.figure("mel_spectrogram", (10, 6)) as (fig, (ax,)):
+            mel_spec = librosa.feature.melspectrogram(y=y, sr=sr, n_mels=n_mels)
+            mel_spec_db = librosa.power_to_db(mel_spec, ref=np.max)
+            
+            img = librosa.display.specshow(mel_spec_db, sr=sr, x_axis='time', y_axis='mel', 
+                                           cmap='viridis', ax=ax)
+            fig.colorbar(img, ax=ax, format="%+2.f dB")
+            ax.set_title(f"Mel Spectrogram: {file_name}")
+            fig.tight_layout()
+            
+            images["mel_spectrogram"] = writer.save(fig, output_dir, f"{file_name}_mel_spectrogram", dpi=150)
         
         return {
-            "rhythm_grid": f"{file_name}_rhythm_grid.png",
-            "break_analysis": f"{file_name}_break_analysis.png",
-            "mel_spectrogram": f"{file_name}_mel_spectrogram.png",
+            "rhythm_grid": images["rhythm_grid"],
+            "break_analysis": images["break_analysis"],
+            "mel_spectrogram": images["mel_spectrogram"],
             "segment_strengths": segment_strengths,
             "onset_times": [float(t) for t in onset_times.tolist()],  # Convert to native Python float
             "duration": float(duration)  # Convert to native Python float
@@ -145,13 +153,21 @@ def generate_break_visualization(audio_file, output_dir):
         print(f"Error generating break visualization for {audio_file}: {e}")
         return {"error": str(e)}
 
-def generate_bass_visualization(audio_file, output_dir):
+def generate_bass_visualization(audio_file, output_dir, audio=None, sr=None, pitch_hop=512):
     """
     Generate specialized visualizations for bass samples
+    (audio can be an already decoded (y, sr) pair, sr resamples on load and
+    pitch_hop sets the frame hop of the pitch contour)
     """
     try:
+        import librosa
+        import librosa.display
+        renderer = get_renderer()
+        writer = get_image_writer()
+        images = {}
+        
         # Load the audio file
-        y, sr = librosa.load(audio_file, sr=None)
+        y, sr = audio if audio is not None else librosa.load(audio_file, sr=sr)
         
         # Create output directory
         os.makedirs(output_dir, exist_ok=True)
@@ -160,70 +176,58 @@ def generate_bass_visualization(audio_file, output_dir):
         file_name = os.path.basename(audio_file).split('.')[0]
         
         # 1. Create waveform with envelope
-        plt.figure(figsize=(10, 4))
-        
-        # Plot waveform
-        plt.subplot(2, 1, 1)
-        times = np.linspace(0, len(y)/sr, len(y))
-        plt.plot(times, y)
-        plt.title(f"Waveform: {file_name}")
-        
-        # Plot envelope
-        plt.subplot(2, 1, 2)
-        y_env = np.abs(y)
-        y_env_smooth = librosa.util.normalize(
-            np.convolve(y_env, np.ones(int(sr/10))/int(sr/10), mode='same')
-        )
-        plt.plot(times, y_env_smooth)
-        plt.title("Amplitude Envelope")
-        plt.xlabel("Time (s)")
-        plt.tight_layout()
-        
-        plt.savefig(f"{output_dir}/{file_name}_bass_envelope.png", dpi=150)
-        plt.close()
+        with renderer.figure("bass_envelope", (10, 4), nrows=2) as (fig, (wave_ax, env_ax)):
+            # Plot waveform
+            times = np.linspace(0, len(y)/sr, len(y))
+            wave_ax.plot(times, y)
+            wave_ax.set_title(f"Waveform: {file_name}")
+            
+            # Plot envelope
+            y_env = np.abs(y)
+            y_env_smooth = librosa.util.normalize(
+                np.convolve(y_env, np.ones(int(sr/10))/int(sr/10), mode='same')
+            )
+            env_ax.plot(times, y_env_smooth)
+            env_ax.set_title("Amplitude Envelope")
+            env_ax.set_xlabel("Time (s)")
+            fig.tight_layout()
+            
+            images["bass_envelope"] = writer.save(fig, output_dir, f"{file_name}_bass_envelope", dpi=150)
         
         # 2. Create low frequency spectrogram (focused on bass range)
-        plt.figure(figsize=(10, 6))
-        D = librosa.amplitude_to_db(np.abs(librosa.stft(y)), ref=np.max)
-        
-        # Focus on bass frequencies (up to 250 Hz)
-        max_freq_idx = int(250 * D.shape[0] / (sr/2))
-        bass_spec = D[:max_freq_idx, :]
-        
-        img = librosa.display.specshow(bass_spec, sr=sr, x_axis='time', y_axis='linear',
-                                     cmap='magma')
-        plt.colorbar(img, format="%+2.f dB")
-        plt.title(f"Bass Frequency Spectrogram (0-250Hz): {file_name}")
-        plt.tight_layout()
-        
-        plt.savefig(f"{output_dir}/{file_name}_bass_spectrogram.png", dpi=150)
-        plt.close()
+        with renderer.figure("bass_spectrogram", (10, 6)) as (fig, (ax,)):
+            D = librosa.amplitude_to_db(np.abs(librosa.stft(y)), ref=np.max)
+            
+            # Focus on bass frequencies (up to 250 Hz)
+            max_freq_idx = int(250 * D.shape[0] / (sr/2))
+            bass_spec = D[:max_freq_idx, :]
+            
+            img = librosa.display.specshow(bass_spec, sr=sr, x_axis='time', y_axis='linear',
+                                           cmap='magma', ax=ax)
+            fig.colorbar(img, ax=ax, format="%+2.f dB")
+            ax.set_title(f"Bass Frequency Spectrogram (0-250Hz): {file_name}")
+            fig.tight_layout()
+            
+            images["bass_spectrogram"] = writer.save(fig, output_dir, f"{file_name}_bass_spectrogram", dpi=150)
         
         # 3. Extract fundamental frequency contour
-        plt.figure(figsize=(10, 4))
-        
         # Extract pitch using YIN algorithm
-        pitches, magnitudes = librosa.core.piptrack(y=y, sr=sr, fmin=30, fmax=300)
+        pitches, magnitudes = librosa.core.piptrack(y=y, sr=sr, fmin=30, fmax=300, hop_length=pitch_hop)
         
         # Get the most prominent pitch at each frame
-        pitch_contour = []
-        times = librosa.times_like(pitches[0])
-        
-        for t, mag in zip(range(magnitudes.shape[1]), magnitudes.T):
-            index = mag.argmax()
-            pitch = pitches[index, t]
-            pitch_contour.append(float(pitch) if pitch > 0 else np.nan)
+        pitch_contour = pitch_contour_from_piptrack(pitches, magnitudes)
+        times = librosa.times_like(pitches[0], sr=sr, hop_length=pitch_hop)
         
         # Plot pitch contour
-        plt.plot(times, pitch_contour)
-        plt.ylim(30, 300)
-        plt.title(f"Fundamental Frequency Contour: {file_name}")
-        plt.xlabel("Time (s)")
-        plt.ylabel("Frequency (Hz)")
-        plt.tight_layout()
-        
-        plt.savefig(f"{output_dir}/{file_name}_pitch_contour.png", dpi=150)
-        plt.close()
+        with renderer.figure("pitch_contour", (10, 4)) as (fig, (ax,)):
+            ax.plot(times, pitch_contour)
+            ax.set_ylim(30, 300)
+            ax.set_title(f"Fundamental Frequency Contour: {file_name}")
+            ax.set_xlabel("Time (s)")
+            ax.set_ylabel("Frequency (Hz)")
+            fig.tight_layout()
+            
+            images["pitch_contour"] = writer.save(fig, output_dir, f"{file_name}_pitch_contour", dpi=150)
         
         # Calculate bass movement pattern (for visualization)
         # Take every n points from the pitch contour
@@ -234,9 +238,9 @@ def generate_bass_visualization(audio_file, output_dir):
         bass_movement = [0 if np.isnan(p) else float(p) for p in bass_movement]
         
         return {
-            "bass_envelope": f"{file_name}_bass_envelope.png",
-            "bass_spectrogram": f"{file_name}_bass_spectrogram.png",
-            "pitch_contour": f"{file_name}_pitch_contour.png",
+            "bass_envelope": images["bass_envelope"],
+            "bass_spectrogram": images["bass_spectrogram"],
+            "pitch_contour": images["pitch_contour"],
             "bass_movement": bass_movement,
             "duration": float(len(y)/sr)
         }
@@ -251,6 +255,9 @@ def generate_midi_note_visualization(midi_file, output_dir):
     """
     try:
         import pretty_midi
+        renderer = get_renderer()
+        writer = get_image_writer()
+        images = {}
         
         # Load MIDI file
         midi_data = pretty_midi.PrettyMIDI(midi_file)
@@ -270,9 +277,6 @@ def generate_midi_note_visualization(midi_file, output_dir):
                 "type": "midi"
             }
         
-        # Piano roll visualization
-        plt.figure(figsize=(12, 6))
-        
         # Get non-empty instruments
         non_empty_instruments = [inst for inst in midi_data.instruments if len(inst.notes) > 0]
         
@@ -294,26 +298,25 @@ def generate_midi_note_visualization(midi_file, output_dir):
                 "type": "midi"
             }
         
-        # Plot piano roll for each non-empty instrument
-        for i, instrument in enumerate(non_empty_instruments):
-            # Get piano roll
-            fs = 100  # sampling frequency (Hz)
-            piano_roll = instrument.get_piano_roll(fs=fs)
-            
-            # Plot as image
-            plt.subplot(len(non_empty_instruments), 1, i+1)
-            plt.imshow(piano_roll, aspect='auto', origin='lower', 
-                      extent=[0, total_duration, 0, 128],
-                      cmap='Blues')
-            
-            plt.ylabel('Pitch')
-            plt.title(f"Instrument {i+1}: {instrument.name if instrument.name else 'Unnamed'}")
+        # Piano roll visualization, one row per non-empty instrument
+        with renderer.figure("piano_roll", (12, 6), nrows=len(non_empty_instruments)) as (fig, axes):
+            for i, (instrument, ax) in enumerate(zip(non_empty_instruments, axes)):
+                # Get piano roll
+                fs = 100  # sampling frequency (Hz)
+                piano_roll = instrument.get_piano_roll(fs=fs)
+                
+                # Plot as image
+                ax.imshow(piano_roll, aspect='auto', origin='lower', 
+                          extent=[0, total_duration, 0, 128],
+                          cmap='Blues')
+                
+                ax.set_ylabel('Pitch')
+                ax.set_title(f"Instrument {i+1}: {instrument.name if instrument.name else 'Unnamed'}")
+                
+            axes[-1].set_xlabel('Time (s)')
+            fig.tight_layout()
             
-        plt.xlabel('Time (s)')
-        plt.tight_layout()
-        
-        plt.savefig(f"{output_dir}/{file_name}_piano_roll.png", dpi=150)
-        plt.close()
+            images["piano_roll"] = writer.save(fig, output_dir, f"{file_name}_piano_roll", dpi=150)
         
         # Extract all notes from all instruments
         all_notes = []
@@ -325,26 +328,26 @@ def generate_midi_note_visualization(midi_file, output_dir):
             return {
                 "error": "No notes found",
                 "file_name": file_name,
-                "piano_roll": f"{file_name}_piano_roll.png",
+                "piano_roll": images["piano_roll"],
                 "type": "midi"
             }
         
         # Create pitch class histogram
         pitch_classes = [note.pitch % 12 for note in all_notes]
-        plt.figure(figsize=(8, 4))
         
         # Plot histogram
         pitch_names = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
         pitch_counts = np.bincount(pitch_classes, minlength=12)
         
-        plt.bar(range(12), pitch_counts, color='steelblue')
-        plt.xticks(range(12), pitch_names)
-        plt.title(f"Pitch Class Distribution: {file_name}")
-        plt.ylabel("Count")
-        plt.tight_layout()
-        
-        plt.savefig(f"{output_dir}/{file_name}_pitch_histogram.png", dpi=150)
-        plt.close()
+        with renderer.figure("pitch_histogram", (8, 4)) as (fig, (ax,)):
+            ax.bar(range(12), pitch_counts, color='steelblue')
+            ax.set_xticks(range(12))
+            ax.set_xticklabels(pitch_names)
+            ax.set_title(f"Pitch Class Distribution: {file_name}")
+            ax.set_ylabel("Count")
+            fig.tight_layout()
+            
+            images["pitch_histogram"] = writer.save(fig, output_dir, f"{file_name}_pitch_histogram", dpi=150, flat=True)
         
         # Extract top 5 most common pitches
         top_pitches = np.argsort(pitch_counts)[::-1][:5].tolist()
@@ -366,32 +369,32 @@ def generate_midi_note_visualization(midi_file, output_dir):
         normalized_density = [float(d / max_density) for d in note_density_over_time]
         
         # Create grid visualization
-        plt.figure(figsize=(12, 3))
-        for i, density in enumerate(normalized_density):
-            # Color based on density (white to blue)
-            color = (1-density, 1-density, 1)  # RGB: white to blue
-            plt.axvspan(i, i+0.9, alpha=0.8, color=color)
+        with renderer.figure("midi_rhythm", (12, 3)) as (fig, (ax,)):
+            for i, density in enumerate(normalized_density):
+                # Color based on density (white to blue)
+                color = (1-density, 1-density, 1)  # RGB: white to blue
+                ax.axvspan(i, i+0.9, alpha=0.8, color=color)
+                
+                # Add text labels for stronger beats
+                if density > 0.5:
+                    ax.text(i+0.45, 0.5, f"{i+1}", ha='center', va='center', 
+                            fontsize=12, fontweight='bold', color='black')
             
-            # Add text labels for stronger beats
-            if density > 0.5:
-                plt.text(i+0.45, 0.5, f"{i+1}", ha='center', va='center', 
-                         fontsize=12, fontweight='bold', color='black')
-        
-        plt.ylim(0, 1)
-        plt.xlim(0, resolution)
-        plt.title(f"MIDI Note Density Pattern: {file_name}")
-        plt.xticks(np.arange(0.5, resolution, 1), [f"{i+1}" for i in range(resolution)])
-        plt.yticks([])
-        plt.grid(False)
-        plt.tight_layout()
-        
-        plt.savefig(f"{output_dir}/{file_name}_midi_rhythm.png", dpi=150)
-        plt.close()
+            ax.set_ylim(0, 1)
+            ax.set_xlim(0, resolution)
+            ax.set_title(f"MIDI Note Density Pattern: {file_name}")
+            ax.set_xticks(np.arange(0.5, resolution, 1))
+            ax.set_xticklabels([f"{i+1}" for i in range(resolution)])
+            ax.set_yticks([])
+            ax.grid(False)
+            fig.tight_layout()
+            
+            images["midi_rhythm"] = writer.save(fig, output_dir, f"{file_name}_midi_rhythm", dpi=150, flat=True)
         
         return {
-            "piano_roll": f"{file_name}_piano_roll.png",
-            "pitch_histogram": f"{file_name}_pitch_histogram.png",
-            "midi_rhythm": f"{file_name}_midi_rhythm.png",
+            "piano_roll": images["piano_roll"],
+            "pitch_histogram": images["pitch_histogram"],
+            "midi_rhythm": images["midi_rhythm"],
             "top_pitches": top_pitches,
             "normalized_density": normalized_density,
             "duration": float(total_duration)
@@ -401,6 +404,51 @@ def generate_midi_note_visualization(midi_file, output_dir):
         print(f"Error generating MIDI visualization for {midi_file}: {e}")
         return {"error": str(e)}
 
+def audio_visualization_type(audio_file):
+    """
+    Classify an audio sample as 'break', 'bass' or 'other' based on its filename
+    """
+    file_name_lower = Path(audio_file).stem.lower()
+    
+    if any(term in file_name_lower for term in ['break', 'amen', 'think']):
+        return 'break'
+    elif any(term in file_name_lower for term in ['bass', 'reese', 'foghorn']):
+        return 'bass'
+    return 'other'
+
+def visualize_audio_file(audio_file, output_dir, audio=None):
+    """
+    Pick the visualization for an audio sample based on its filename and generate it
+    """
+    visualization_type = audio_visualization_type(audio_file)
+    
+    if visualization_type == 'bass':
+        # Generate bass visualizations
+        result = generate_bass_visualization(str(audio_file), str(output_dir), audio)
+    else:
+        # Break visualizations (also used for generic audio for now)
+        result = generate_break_visualization(str(audio_file), str(output_dir), audio)
+    
+    result['type'] = visualization_type
+    return result
+
+def visualize_midi_file(midi_file, output_dir):
+    """
+    Generate the MIDI visualizations for a file and classify it based on its filename
+    """
+    result = generate_midi_note_visualization(str(midi_file), str(output_dir))
+    
+    # Try to classify based on filename
+    file_name_lower = Path(midi_file).stem.lower()
+    if any(term in file_name_lower for term in ['bass', 'reese', 'foghorn']):
+        result['type'] = 'bass'
+    elif any(term in file_name_lower for term in ['ambient', 'pad']):
+        result['type'] = 'ambient'
+    else:
+        result['type'] = 'midi'
+    
+    return result
+
 def main():
     """
     Generate visualizations for all samples
@@ -423,45 +471,16 @@ def main():
     for audio_file in audio_files:
         file_name = audio_file.stem
         print(f"Generating visualizations for {file_name}...")
-        
-        # Classify the element type based on filename
-        file_name_lower = file_name.lower()
-        
-        if any(term in file_name_lower for term in ['break', 'amen', 'think']):
-            # Generate break visualizations
-            result = generate_break_visualization(str(audio_file), str(output_dir))
-            result['type'] = 'break'
-            visualization_data[file_name] = result
-            
-        elif any(term in file_name_lower for term in ['bass', 'reese', 'foghorn']):
-            # Generate bass visualizations
-            result = generate_bass_visualization(str(audio_file), str(output_dir))
-            result['type'] = 'bass'
-            visualization_data[file_name] = result
-            
-        else:
-            # Generic audio visualization (use break visualization for now)
-            result = generate_break_visualization(str(audio_file), str(output_dir))
-            result['type'] = 'other'
-            visualization_data[file_name] = result
+        visualization_data[file_name] = visualize_audio_file(audio_file, output_dir)
     
     # Process MIDI files
     for midi_file in midi_files:
         file_name = midi_file.stem
         print(f"Generating visualizations for MIDI {file_name}...")
-        
-        result = generate_midi_note_visualization(str(midi_file), str(output_dir))
-        
-        # Try to classify based on filename
-        file_name_lower = file_name.lower()
-        if any(term in file_name_lower for term in ['bass', 'reese', 'foghorn']):
-            result['type'] = 'bass'
-        elif any(term in file_name_lower for term in ['ambient', 'pad']):
-            result['type'] = 'ambient'
-        else:
-            result['type'] = 'midi'
-            
-        visualization_data[file_name] = result
+        visualization_data[file_name] = visualize_midi_file(midi_file, output_dir)
+    
+    # Wait for the images still being encoded
+    get_image_writer().close()
     
     # Save visualization data to JSON with the custom encoder
     with open(output_dir / 'visualization_metadata.json', 'w') as f:
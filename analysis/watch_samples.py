@@ -0,0 +1,166 @@
+import argparse
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+from watchdog.events import FileSystemEventHandler
+from watchdog.observers import Observer
+
+from pipeline import (
+    AUDIO_EXTENSIONS, MIDI_EXTENSIONS, SAMPLES_DIR, DATA_DIR, IMAGE_DIR, VISUALIZATION_DIR,
+    is_sample, scan_samples, element_name, transcribe_files, analyze_files, visualize_files,
+    patch_json, load_visualization_helpers
+)
+
+STATE_PATH = DATA_DIR / ".watch_state.json"
+
+def file_fingerprint(path):
+    """(mtime, size) pair used to decide whether a file changed since it was last processed."""
+    stat = os.stat(path)
+    return [stat.st_mtime_ns, stat.st_size]
+
+class SampleWatcher(FileSystemEventHandler):
+    """
+    Collects filesystem events on the samples directory, debounces them and
+    runs transcription, analysis and visualization for the changed files only.
+    """
+
+    def __init__(self, debounce=2.0, transcribe=True, state_path=STATE_PATH):
+        super().__init__()
+        self.debounce = debounce
+        self.transcribe = transcribe
+        self.state_path = Path(state_path)
+        self.state = {}
+        if self.state_path.exists():
+            with open(self.state_path) as f:
+                self.state = json.load(f)
+
+        self._pending = set()
+        self._timer = None
+        self._lock = threading.Lock()
+        self._process_lock = threading.Lock()
+
+    def on_any_event(self, event):
+        if event.is_directory:
+            return
+        for path in [event.src_path, getattr(event, "dest_path", None)]:
+            if path and is_sample(path):
+                self.schedule(os.path.relpath(path))
+
+    def schedule(self, path):
+        """Queue a path and restart the debounce timer."""
+        with self._lock:
+            self._pending.add(path)
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = threading.Timer(self.debounce, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self):
+        """Process everything queued since the last flush."""
+        with self._lock:
+            paths = self._pending
+            self._pending = set()
+            self._timer = None
+        if paths:
+            self.process(paths)
+
+    def process(self, paths):
+        """
+        Re-run the pipeline for the added or changed files among paths and
+        drop the output entries of files that were removed.
+        """
+        with self._process_lock:
+            changed = []
+            removed = []
+            for path in sorted(paths):
+                if os.path.exists(path):
+                    if self.state.get(path) != file_fingerprint(path):
+                        changed.append(path)
+                elif path in self.state:
+                    removed.append(path)
+
+            if not changed and not removed:
+                return
+
+            start_time = time.time()
+            print(f"Processing {len(changed)} changed and {len(removed)} removed samples...")
+
+            audio_files = [p for p in changed if Path(p).suffix.lower() in AUDIO_EXTENSIONS]
+            midi_files = [p for p in changed if Path(p).suffix.lower() in MIDI_EXTENSIONS]
+
+            # 1. Transcription (new MIDI files are recorded so their events are ignored)
+            if self.transcribe and audio_files:
+                try:
+                    for midi_file in transcribe_files(audio_files):
+                        midi_file = str(midi_file)
+                        if midi_file not in midi_files:
+                            midi_files.append(midi_file)
+                except Exception as e:
+                    print(f"Error transcribing samples: {e}")
+
+            files = audio_files + midi_files
+
+            # 2. Analysis
+            element_analysis, visualization_data = analyze_files(files, IMAGE_DIR)
+
+            # 3. Visualization
+            visualization_metadata = visualize_files(files, VISUALIZATION_DIR)
+
+            # Patch the output JSON in place
+            removed_names = [element_name(p) for p in removed]
+            patch_json(DATA_DIR / "element_analysis.json", element_analysis, removed_names)
+            patch_json(DATA_DIR / "visualization_data.json", visualization_data, removed_names)
+            patch_json(VISUALIZATION_DIR / "visualization_metadata.json", visualization_metadata,
+                       [Path(p).stem for p in removed], cls=load_visualization_helpers().NumpyEncoder)
+
+            for path in files:
+                if os.path.exists(path):
+                    self.state[path] = file_fingerprint(path)
+            for path in removed:
+                self.state.pop(path, None)
+            self.save_state()
+
+            print(f"Updated {', '.join(element_name(p) for p in files + removed)} "
+                  f"in {time.time() - start_time:.1f}s")
+
+    def save_state(self):
+        os.makedirs(self.state_path.parent, exist_ok=True)
+        with open(self.state_path, "w") as f:
+            json.dump(self.state, f, indent=4)
+
+def main():
+    parser = argparse.ArgumentParser(description="Watch analysis/samples and incrementally re-analyze changes")
+    parser.add_argument("--debounce", type=float, default=2.0,
+                        help="Seconds to wait for filesystem events to settle")
+    parser.add_argument("--no-transcribe", action="store_true",
+                        help="Skip basic-pitch transcription of new audio samples")
+    parser.add_argument("--skip-initial-scan", action="store_true",
+                        help="Do not catch up on samples changed while the watcher was not running")
+    args = parser.parse_args()
+
+    watcher = SampleWatcher(debounce=args.debounce, transcribe=not args.no_transcribe)
+
+    # Catch up on anything that changed since the last run
+    if not args.skip_initial_scan:
+        watcher.process(set(scan_samples()) | set(watcher.state))
+
+    observer = Observer()
+    observer.schedule(watcher, str(SAMPLES_DIR), recursive=True)
+    observer.start()
+    print(f"Watching {SAMPLES_DIR}/ for changes (Ctrl+C to stop)")
+
+    try:
+        while observer.is_alive():
+            observer.join(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        observer.stop()
+        observer.join()
+
+if __name__ == "__main__":
+    main()
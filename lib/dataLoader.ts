@@ -1,9 +1,34 @@
-import { MixAnnotations, ElementAnalysis, Pattern } from './types';
+import { MixAnnotations, ElementAnalysis, Pattern, SegmentAnalysis, HarmonyAnalysis, AssetManifest } from './types';
 
 /**
  * Utilities for loading and preparing data for the Jungle/DNB visualization
  */
 
+let assetManifestPromise: Promise<AssetManifest | null> | null = null;
+
+/**
+ * Loads the asset manifest written by analysis/publish_assets.py (fetched once)
+ * @returns {Promise<AssetManifest | null>} The manifest, or null if nothing was published
+ */
+export const loadAssetManifest = (): Promise<AssetManifest | null> => {
+  if (!assetManifestPromise) {
+    assetManifestPromise = fetch('/data/asset-manifest.json', { cache: 'no-cache' })
+      .then(response => response.ok ? response.json() as Promise<AssetManifest> : null)
+      .catch(() => null);
+  }
+  return assetManifestPromise;
+};
+
+/**
+ * Resolves a published analysis output to its content-hashed URL
+ * @param {string} logicalName Path of the output relative to the data directory
+ * @returns {Promise<string>} The hashed URL, or the plain /data URL if it was not published
+ */
+export const resolveAssetUrl = async (logicalName: string): Promise<string> => {
+  const manifest = await loadAssetManifest();
+  return manifest?.assets[logicalName]?.url ?? `/data/${logicalName}`;
+};
+
 /**
  * Loads the mix annotations JSON file
  * @returns {Promise<MixAnnotations>} The loaded mix annotations data
@@ -43,28 +68,65 @@ export const loadElementAnalysis = async (): Promise<ElementAnalysis> => {
   }
 };
 
+/**
+ * Loads the per-pattern segment analysis JSON file produced by analyze_segments.py
+ * @returns {Promise<SegmentAnalysis>} The loaded segment analysis data
+ */
+export const loadSegmentAnalysis = async (): Promise<SegmentAnalysis> => {
+  try {
+    const response = await fetch(await resolveAssetUrl('segment_analysis.json'));
+    if (!response.ok) {
+      throw new Error(`Failed to load segment analysis: ${response.status}`);
+    }
+    return await response.json() as SegmentAnalysis;
+  } catch (error) {
+    console.error('Error loading segment analysis:', error);
+    return {};
+  }
+};
+
+/**
+ * Loads the key and chord timelines produced by harmony.py
+ * @returns {Promise<HarmonyAnalysis>} The loaded harmony analysis data
+ */
+export const loadHarmonyAnalysis = async (): Promise<HarmonyAnalysis> => {
+  try {
+    const response = await fetch(await resolveAssetUrl('harmony_analysis.json'));
+    if (!response.ok) {
+      throw new Error(`Failed to load harmony analysis: ${response.status}`);
+    }
+    return await response.json() as HarmonyAnalysis;
+  } catch (error) {
+    console.error('Error loading harmony analysis:', error);
+    return {};
+  }
+};
+
 /**
  * Merges the mix annotations with the detailed element analysis
  * @returns {Promise<MixAnnotations>} Enhanced mix annotations with detailed element data
  */
 export const loadEnhancedMixData = async (): Promise<MixAnnotations> => {
   try {
-    const [mixData, analysisData] = await Promise.all([
+    const [mixData, analysisData, segmentData] = await Promise.all([
       loadMixAnnotations(),
-      loadElementAnalysis()
+      loadElementAnalysis(),
+      loadSegmentAnalysis()
     ]);
     
     // Enhance each pattern with its full analysis data if available
     const enhancedPatterns = mixData.patterns.map((pattern: Pattern) => {
       const analysisKey = pattern.name.toLowerCase().replace(/\s+/g, '_');
       const analysis = analysisData[analysisKey];
+      const segments = segmentData[analysisKey];
       
       if (!analysis) {
-        return pattern;
+        return segments ? { ...pattern, segment_analysis: segments } : pattern;
       }
       
       return {
         ...pattern,
+        segment_analysis: segments,
         fingerprint: pattern.fingerprint || {},
         // Copy visualization properties directly
         rhythm_pattern: analysis.rhythm_pattern,
@@ -0,0 +1,32 @@
+import { LiveFrame } from './types';
+
+/**
+ * Client for the live analysis stream served by analysis/live_stream.py
+ */
+
+/**
+ * Connects to the live analysis WebSocket and calls onFrame for every frame
+ * @param {(frame: LiveFrame) => void} onFrame Callback receiving each analysis frame
+ * @param {string} url WebSocket URL of the live analysis stream
+ * @returns {() => void} Function that closes the connection
+ */
+export const connectLiveStream = (
+  onFrame: (frame: LiveFrame) => void,
+  url: string = 'ws://localhost:8765'
+): (() => void) => {
+  const socket = new WebSocket(url);
+
+  socket.onmessage = (event: MessageEvent) => {
+    try {
+      onFrame(JSON.parse(event.data) as LiveFrame);
+    } catch (error) {
+      console.error('Error parsing live analysis frame:', error);
+    }
+  };
+
+  socket.onerror = (error) => {
+    console.error('Live analysis stream error:', error);
+  };
+
+  return () => socket.close();
+};
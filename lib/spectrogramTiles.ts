@@ -0,0 +1,94 @@
+import { TileManifest, TileLevel } from './types';
+import { resolveAssetUrl } from './dataLoader';
+
+/**
+ * Helpers for zoomable spectrograms built by analysis/spectrogram_tiles.py
+ */
+
+// Tiles published by analysis/publish_assets.py, one content-hashed directory per tile set
+export const STATIC_TILE_URL = '/data/tiles';
+
+export interface VisibleTile {
+  zoom: number;
+  x: number;
+  y: number;
+  url: string;
+}
+
+/**
+ * Resolves the directory a sample's tile set is served from
+ * @param {string} baseUrl Root the tiles are served from (analysis service or STATIC_TILE_URL)
+ * @param {string} name Sample name
+ * @param {string} kind 'spectrogram' or 'mel_spectrogram'
+ * @returns {Promise<string>} The tile set URL, versioned by content hash when published
+ */
+export const resolveTileSetUrl = async (baseUrl: string, name: string, kind: string): Promise<string> => {
+  if (baseUrl === STATIC_TILE_URL) {
+    return resolveAssetUrl(`tiles/${name}/${kind}`);
+  }
+  return `${baseUrl}/${name}/${kind}`;
+};
+
+/**
+ * Loads the tile manifest of a tile set
+ * @param {string} tileSetUrl Tile set URL from resolveTileSetUrl
+ * @returns {Promise<TileManifest | null>} The manifest, or null if unavailable
+ */
+export const loadTileManifest = async (tileSetUrl: string): Promise<TileManifest | null> => {
+  try {
+    // Published sets are versioned, but the analysis service rebuilds in place
+    const response = await fetch(`${tileSetUrl}/manifest.json`, { cache: 'no-cache' });
+    if (!response.ok) {
+      throw new Error(`Failed to load tile manifest: ${response.status}`);
+    }
+    return await response.json() as TileManifest;
+  } catch (error) {
+    console.error('Error loading tile manifest:', error);
+    return null;
+  }
+};
+
+/**
+ * Picks the coarsest level that still has at least one data column per screen pixel
+ * @param {TileManifest} manifest Tile manifest
+ * @param {number} secondsPerScreenPixel Time span covered by one screen pixel
+ * @returns {TileLevel} The level to display
+ */
+export const levelForZoom = (manifest: TileManifest, secondsPerScreenPixel: number): TileLevel => {
+  const candidates = manifest.levels.filter(level => level.seconds_per_pixel <= secondsPerScreenPixel);
+  return candidates.length > 0 ? candidates[0] : manifest.levels[manifest.levels.length - 1];
+};
+
+/**
+ * Lists the tiles of a level that cover a time range, across all frequency rows
+ * @param {TileManifest} manifest Tile manifest
+ * @param {TileLevel} level Level to display
+ * @param {number} startTime Start of the visible range in seconds
+ * @param {number} endTime End of the visible range in seconds
+ * @param {string} tileSetUrl Tile set URL from resolveTileSetUrl
+ * @returns {VisibleTile[]} Tiles to fetch, with their URLs
+ */
+export const visibleTiles = (
+  manifest: TileManifest,
+  level: TileLevel,
+  startTime: number,
+  endTime: number,
+  tileSetUrl: string
+): VisibleTile[] => {
+  const secondsPerTile = level.seconds_per_pixel * manifest.tile_size;
+  const firstColumn = Math.max(0, Math.floor(startTime / secondsPerTile));
+  const lastColumn = Math.min(level.columns - 1, Math.floor(endTime / secondsPerTile));
+
+  const tiles: VisibleTile[] = [];
+  for (let x = firstColumn; x <= lastColumn; x++) {
+    for (let y = 0; y < level.rows; y++) {
+      tiles.push({
+        zoom: level.zoom,
+        x,
+        y,
+        url: `${tileSetUrl}/${level.zoom}/${x}/${y}.png`
+      });
+    }
+  }
+  return tiles;
+};
@@ -25,6 +25,48 @@ export interface Pattern {
   pitch_histogram?: number[];
   note_density_over_time?: number[];
   most_common_pitches?: number[];
+
+  segment_analysis?: PatternSegmentAnalysis;
+}
+
+// Analysis of one annotated range of the mix (see analysis/analyze_segments.py)
+export interface SegmentFeatures {
+  pattern: string;
+  key: string;
+  timestamp_index: number;
+  start: number;
+  end: number;
+  song?: string;
+  duration?: number;
+  tempo?: number;
+  onset_count?: number;
+  onset_density?: number;
+  onset_times?: number[];
+  rhythm_pattern?: number[];
+  spectral_centroid_mean?: number;
+  spectral_bandwidth_mean?: number;
+  rms_mean?: number;
+  rms_max?: number;
+  midi?: Record<string, unknown>;
+  error?: string;
+}
+
+export interface PatternSegmentAnalysis {
+  name: string;
+  segments: SegmentFeatures[];
+  summary: {
+    segment_count?: number;
+    total_duration?: number;
+    tempo_mean?: number;
+    onset_density_mean?: number;
+    spectral_centroid_mean?: number;
+    rms_mean?: number;
+    rhythm_pattern?: number[];
+  };
+}
+
+export interface SegmentAnalysis {
+  [key: string]: PatternSegmentAnalysis;
 }
 
 // lib/types.ts
@@ -51,6 +93,8 @@ export interface ElementDetails {
   most_common_pitches?: number[];
   note_density_over_time?: number[];
   rhythm_pattern?: number[];
+  key?: string;
+  chord_timeline?: ChordSegment[];
   waveform_url?: string;
   spectrogram_url?: string;
 }
@@ -59,6 +103,89 @@ export interface ElementAnalysis {
   [key: string]: ElementDetails;
 }
 
+// Key, chord and key timelines of transcribed MIDI (see analysis/harmony.py)
+export interface ChordSegment {
+  start: number;
+  end: number;
+  chord: string;
+  confidence: number;
+}
+
+export interface KeySegment {
+  start: number;
+  end: number;
+  key: string;
+  confidence: number;
+}
+
+export interface ElementHarmony {
+  key?: string;
+  key_confidence?: number;
+  beat_count?: number;
+  chroma_profile?: number[];
+  chord_timeline?: ChordSegment[];
+  key_timeline?: KeySegment[];
+  error?: string;
+}
+
+export interface HarmonyAnalysis {
+  [key: string]: ElementHarmony;
+}
+
+// Frame pushed by the live analysis stream (see analysis/live_stream.py)
+export interface LiveFrame {
+  frame: number;
+  time: number;
+  onset_strength: number;
+  rms: number;
+  rhythm_grid: number[];
+  bass_pitch: number | null;
+  processing_ms: number;
+}
+
+// Spectrogram tile pyramid manifest (see analysis/spectrogram_tiles.py)
+export interface TileLevel {
+  zoom: number;
+  width: number;
+  height: number;
+  columns: number;
+  rows: number;
+  seconds_per_pixel: number;
+  bins_per_pixel: number;
+}
+
+export interface TileManifest {
+  name: string;
+  kind: string;
+  tile_size: number;
+  max_zoom: number;
+  duration: number;
+  sample_rate: number;
+  n_fft: number;
+  hop_length: number;
+  frequency_scale: string;
+  fmax: number;
+  db_max: number;
+  db_min: number;
+  cmap: string;
+  levels: TileLevel[];
+}
+
+// Content-hashed asset manifest (see analysis/publish_assets.py)
+export interface PublishedAsset {
+  url: string;
+  hash: string;
+  size: number;
+  encodings: string[];
+}
+
+export interface AssetManifest {
+  version: number;
+  assets: {
+    [logicalName: string]: PublishedAsset;
+  };
+}
+
 // YouTube API related types
 export interface YouTubePlayerEvent {
   target: YouTubePlayer;